@@ -1,10 +1,26 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect
+from flask import Flask, Response, make_response, render_template, request, jsonify, send_file, send_from_directory, session, redirect
 import os
-import json
+import orjson
+import base64
+import glob
 import hashlib
+import logging
+import mmap
+import pickle
 import re
+import shutil
+import sys
 import time
+import threading
+import traceback
+import uuid
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import StringIO
+
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 
 from mtr_pathfinder_lib.mtr_pathfinder import (
     main as mtr_main_v3,
@@ -18,12 +34,37 @@ from mtr_pathfinder_lib.mtr_pathfinder_v4 import (
     main as mtr_main_v4,
     save_image as save_image_v4,
     fetch_data as fetch_data_v4,
-    gen_departure as gen_departure_v4
+    gen_departure as gen_departure_v4,
+    RouteType as RouteTypeV4
 )
 
+# 使用orjson作为Flask的JSON实现：request.json、jsonify和模板中的tojson都会经过这里
+class OrjsonProvider(JSONProvider):
+    # 与Flask默认实现保持一致，输出时按键排序
+    sort_keys = True
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = 'your-secret-key'
 
+# 压缩HTML/JSON等文本响应（gzip/br），页面中大量重复的样式和表格行压缩效果明显
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'text/css', 'application/json', 'application/javascript']
+app.config['COMPRESS_LEVEL'] = 6
+Compress(app)
+
+# 启动时预先编译全部模板：Flask会缓存编译结果，首个请求无需再解析模板
+for template_name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(template_name)
+
 # 全局进度跟踪变量
 search_progress = {
     'percentage': 0,
@@ -38,6 +79,22 @@ data_update_progress = {
     'message': '正在准备数据更新...'
 }
 
+# 数据更新任务：单线程执行器保证同一时间只有一个更新在运行
+# （更新过程会替换sys.stdin），正在更新时再次请求会等待同一个任务
+update_executor = ThreadPoolExecutor(max_workers=1)
+update_future = None
+update_lock = threading.Lock()
+
+# v3寻路库通过模块级变量（original、intervals）在建图和处理路径之间传递数据，
+# 同一时间只允许一个v3寻路计算，避免并发请求互相覆盖；其他请求（列表页面、搜索等）不受影响
+v3_pathfinding_lock = threading.Lock()
+
+# 寻路结果缓存：寻路参数和数据文件都相同的请求直接返回已计算的结果，不再重新寻路
+# 以字典的插入顺序实现LRU，超过容量时删除最久未使用的结果；配置修改或数据更新时清空
+ROUTE_RESULT_CACHE_SIZE = 512
+route_result_cache = {}
+route_result_lock = threading.Lock()
+
 # 寻路次数统计
 route_search_count = 0
 
@@ -47,6 +104,12 @@ data_checked = False
 # 配置文件路径
 CONFIG_PATH = 'config.json'
 
+# 数据更新时寻路库会询问是否替换文件，提供足够的'y'响应
+AUTO_CONFIRM_INPUT = 'y\n' * 20
+
+# 环境变量中数组配置的分隔符：中文逗号、顿号和分号统一转换为英文逗号
+LIST_SEPARATORS = str.maketrans({'，': ',', '、': ',', ';': ',', '；': ','})
+
 # 默认配置
 default_config = {
     'LINK': 'https://letsplay.minecrafttransitrailway.com/system-map',
@@ -62,17 +125,34 @@ default_config = {
     'UMAMI_WEBSITE_ID': ''
 }
 
+# 小于该大小（字节）的文件直接读取，不使用mmap
+MMAP_MIN_SIZE = 1 << 20
+
+# 读取JSON数据文件：通过mmap映射文件交给orjson解析，不再额外复制一份完整的bytes
+# 空文件（如下载中断）无法映射，与小文件一样直接读取，由orjson给出解析错误
+# 映射在返回前即关闭，不会阻止数据更新时替换文件（Windows）
+def load_json(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return orjson.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+            return orjson.loads(view)
+
 # 加载配置
 def load_config():
     # 先加载默认配置
     config = default_config.copy()
     
     # 如果配置文件存在，使用配置文件的内容更新默认配置
-    if os.path.exists(CONFIG_PATH):
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-            config_file = json.load(f)
-            # 使用配置文件的内容更新默认配置，确保所有默认字段都存在
-            config.update(config_file)
+    # 直接打开文件，不存在时跳过，不再单独检查文件是否存在
+    try:
+        config_file = load_json(CONFIG_PATH)
+    except FileNotFoundError:
+        pass
+    else:
+        # 使用配置文件的内容更新默认配置，确保所有默认字段都存在
+        config.update(config_file)
     
     # 从环境变量加载配置，优先级最高
     for key, default_value in default_config.items():
@@ -101,19 +181,20 @@ def load_config():
                 # 数组处理，支持JSON数组格式或逗号分隔格式
                 try:
                     # 尝试解析为JSON数组
-                    config[key] = json.loads(env_value)
+                    config[key] = orjson.loads(env_value)
                     if not isinstance(config[key], list):
                         raise ValueError("Not a list")
-                except (ValueError, json.JSONDecodeError):
-                    # 尝试按逗号分隔处理
-                    config[key] = [item.strip() for item in env_value.split(',')]
+                except (ValueError, orjson.JSONDecodeError):
+                    # 尝试按逗号分隔处理（一次性转换各种分隔符）
+                    items = env_value.translate(LIST_SEPARATORS).split(',')
+                    config[key] = [item.strip() for item in items]
             elif isinstance(default_value, dict):
                 # 对象处理，需要JSON格式
                 try:
-                    config[key] = json.loads(env_value)
+                    config[key] = orjson.loads(env_value)
                     if not isinstance(config[key], dict):
                         raise ValueError("Not a dictionary")
-                except (ValueError, json.JSONDecodeError):
+                except (ValueError, orjson.JSONDecodeError):
                     print(f"Warning: Environment variable {env_key} is not a valid JSON object, using default value")
             else:
                 # 字符串处理，直接使用
@@ -121,37 +202,393 @@ def load_config():
     
     return config
 
-# 保存配置
+# 保存配置：内容与文件中已有的配置相同时（如每次启动时的保存）不再重写文件
 def save_config(config):
-    with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
-        json.dump(config, f, ensure_ascii=False, indent=2)
+    content = orjson.dumps(config, option=orjson.OPT_INDENT_2)
+    try:
+        with open(CONFIG_PATH, 'rb') as f:
+            if f.read() == content:
+                return
+    except FileNotFoundError:
+        pass
+    with open(CONFIG_PATH, 'wb') as f:
+        f.write(content)
 
 # 初始化配置
 config = load_config()
 
+# 根据地图链接和MTR版本生成各数据文件路径，以(链接, 版本)为键缓存，
+# 配置未变化时不再重复计算md5
+# 文件名中的md5摘要需与mtr_pathfinder_lib保持一致，不能更换摘要算法
+@lru_cache(maxsize=8)
+def get_data_file_paths(link, mtr_ver):
+    link_hash = hashlib.md5(link.encode('utf-8')).hexdigest()
+    # 为v3和v4版本分别生成不同的文件路径
+    return {
+        'LOCAL_FILE_PATH_V3': f'mtr-original-data-{link_hash}-mtr{mtr_ver}-v3.json',
+        'LOCAL_FILE_PATH_V4': f'mtr-original-data-{link_hash}-mtr4-v4.json',
+        'DEP_PATH_V3': f'mtr-departure-data-{link_hash}-mtr{mtr_ver}-v3.json',
+        'DEP_PATH_V4': f'mtr-route-departure-data-{link_hash}-mtr4-v4.json',
+        'INTERVAL_PATH_V3': f'mtr-route-interval-data-{link_hash}-mtr{mtr_ver}-v3.json',
+    }
+
 # 根据配置中的文件路径配置变量
 def update_file_paths():
     if config['LINK']:
-        link_hash = hashlib.md5(config['LINK'].encode('utf-8')).hexdigest()
-        # 为v3和v4版本分别生成不同的文件路径
-        config['LOCAL_FILE_PATH_V3'] = f'mtr-original-data-{link_hash}-mtr{config["MTR_VER"]}-v3.json'
-        config['LOCAL_FILE_PATH_V4'] = f'mtr-original-data-{link_hash}-mtr4-v4.json'
-        config['DEP_PATH_V3'] = f'mtr-departure-data-{link_hash}-mtr{config["MTR_VER"]}-v3.json'
-        config['DEP_PATH_V4'] = f'mtr-route-departure-data-{link_hash}-mtr4-v4.json'
-        config['INTERVAL_PATH_V3'] = f'mtr-route-interval-data-{link_hash}-mtr{config["MTR_VER"]}-v3.json'
+        config.update(get_data_file_paths(config['LINK'], config['MTR_VER']))
         # 兼容现有代码，保持旧的键名
         config['LOCAL_FILE_PATH'] = config['LOCAL_FILE_PATH_V3']
         config['DEP_PATH'] = config['DEP_PATH_V3']
         config['INTERVAL_PATH'] = config['INTERVAL_PATH_V3']
-    save_config(config)
 
 update_file_paths()
+save_config(config)
 BASE_PATH = 'mtr_pathfinder_data'
 PNG_PATH = 'mtr_pathfinder_data'
 
+# 统一数据格式为[{'stations': {...}, 'routes': [...]}]：寻路库写出的数据均为此格式，
+# 这里兼容旧的字典格式和字典形式的线路，读取方只需按这一种格式处理
+# 同时在加载时校验一次数据形状：丢弃不是字典的车站和线路，
+# 读取方遍历车站和线路时无需再逐项判断类型
+# 线路的站点列表不在这里校验：MTR 3数据的站点为字符串，
+# 遍历站点的读取方需按线路检查第一个站点是否为字典
+def normalize_data(data):
+    if isinstance(data, dict):
+        data = [data]
+    if not data:
+        return [{'stations': {}, 'routes': []}]
+    first = data[0]
+    stations = first.get('stations', {})
+    routes = first.get('routes', [])
+    if isinstance(routes, dict):
+        routes = list(routes.values())
+    if not all(isinstance(station, dict) for station in stations.values()):
+        stations = {station_id: station for station_id, station in stations.items()
+                    if isinstance(station, dict)}
+    if not all(isinstance(route, dict) for route in routes):
+        routes = [route for route in routes if isinstance(route, dict)]
+    # 原始数据在缓存中共享，格式不一致时生成新的字典，不修改原始数据
+    if first.get('stations') is not stations or first.get('routes') is not routes:
+        first = dict(first, stations=stations, routes=routes)
+        data = [first] + data[1:]
+    return data
+
+# 数据文件的pickle快照，冷启动时直接反序列化，省去JSON解析
+def snapshot_path(path):
+    return path + '.pkl'
+
+# 数据更新后写入快照：先写临时文件再替换，避免读到写了一半的快照
+def write_snapshot(path):
+    if not os.path.exists(path):
+        return
+    tmp_path = snapshot_path(path) + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(load_json(path), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path(path))
+    except Exception as e:
+        print(f"写入数据快照失败: {str(e)}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+# 快照不早于JSON文件时读取快照，否则（或快照损坏时）回退到解析JSON
+def load_data_file(path, mtime_ns):
+    pkl_path = snapshot_path(path)
+    pkl_mtime_ns = file_mtime_ns(pkl_path)
+    if pkl_mtime_ns is not None and pkl_mtime_ns >= mtime_ns:
+        try:
+            with open(pkl_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return pickle.loads(mm)
+        except Exception:
+            pass
+    return load_json(path)
+
+# 按(路径, 修改时间)缓存解析结果，数据更新后修改时间变化，缓存自动失效
+@lru_cache(maxsize=4)
+def _parse_cached(path, mtime_ns):
+    return load_data_file(path, mtime_ns)
+
+# 加锁读取缓存：多个请求同时遇到未缓存的文件时只解析一次
+# 注意：返回的对象在请求之间共享，调用方不得修改
+_load_lock = threading.Lock()
+
+def _load_raw(path, mtime_ns):
+    with _load_lock:
+        return _parse_cached(path, mtime_ns)
+
+# 获取文件修改时间（纳秒），文件不存在时返回None
+def file_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+# 数据文件版本号（修改时间，精确到分钟），只stat一次，文件不存在时返回空字符串
+# utc为True时与寻路库一致使用UTC时间，否则使用本地时间
+def file_version(path, utc=False):
+    mtime_ns = file_mtime_ns(path)
+    if mtime_ns is None:
+        return ''
+    return _format_version(mtime_ns // 1_000_000_000, utc)
+
+# 将修改时间（秒）格式化为版本号，文件未变化时直接复用格式化结果
+@lru_cache(maxsize=16)
+def _format_version(seconds, utc):
+    return time.strftime('%Y%m%d-%H%M',
+                         time.gmtime(seconds) if utc else time.localtime(seconds))
+
+# 数据文件版本号的缓存时长（秒）
+DATA_VERSION_TTL = 2
+
+# 控制台和寻路结果中展示的各数据文件版本号（只读）
+# 按DATA_VERSION_TTL秒的时间段缓存，短时间内的多次请求不再重复stat四个文件
+def get_data_versions():
+    return _data_versions(config['LOCAL_FILE_PATH_V3'], config['LOCAL_FILE_PATH_V4'],
+                          config['DEP_PATH_V4'], config['INTERVAL_PATH_V3'],
+                          int(time.time() // DATA_VERSION_TTL))
+
+# 按(各数据文件路径, 时间段)缓存版本号，时间段变化后自动重新读取；数据更新后需调用cache_clear()
+@lru_cache(maxsize=2)
+def _data_versions(station_path, station_path_v4, dep_path_v4, interval_path, time_bucket):
+    return {
+        'station_version': file_version(station_path),
+        'station_version_v4': file_version(station_path_v4),
+        'route_version_v4': file_version(dep_path_v4),
+        'interval_version': file_version(interval_path)
+    }
+
+# 查找已缓存的寻路结果，找到时将其移到最近使用的位置，找不到时返回None
+def get_route_result(key):
+    with route_result_lock:
+        result = route_result_cache.pop(key, None)
+        if result is not None:
+            route_result_cache[key] = result
+        return result
+
+# 缓存寻路结果，超过容量时删除最久未使用的结果
+def put_route_result(key, result):
+    with route_result_lock:
+        route_result_cache[key] = result
+        while len(route_result_cache) > ROUTE_RESULT_CACHE_SIZE:
+            del route_result_cache[next(iter(route_result_cache))]
+
+# 清空寻路结果缓存：寻路结果取决于配置，配置修改或数据更新后需调用
+def clear_route_results():
+    with route_result_lock:
+        route_result_cache.clear()
+
+# 读取数据文件（带缓存），文件不存在时返回None
+def load_data(path):
+    mtime_ns = file_mtime_ns(path)
+    if mtime_ns is None:
+        return None
+    return _load_raw(path, mtime_ns)
+
+# 读取统一格式的车站数据文件（带缓存）
+# 寻路库写出的数据已是统一格式，此时直接返回缓存中的对象
+def _load_station_data(path, mtime_ns):
+    return normalize_data(_load_raw(path, mtime_ns))
+
+# 读取统一格式的车站数据文件（带缓存，只读），文件不存在时返回None
+def load_station_data(path):
+    mtime_ns = file_mtime_ns(path)
+    if mtime_ns is None:
+        return None
+    return _load_station_data(path, mtime_ns)
+
+# 车站ID到展示名称（竖杠替换为空格）的映射，按(路径, 修改时间)缓存
+@lru_cache(maxsize=2)
+def _station_display_names(path, mtime_ns):
+    stations = _load_station_data(path, mtime_ns)[0]['stations']
+    return {station_id: station['name'].replace('|', ' ')
+            for station_id, station in stations.items() if 'name' in station}
+
+# 获取车站展示名称映射，文件不存在时返回空字典
+def station_display_names(path):
+    mtime_ns = file_mtime_ns(path)
+    if mtime_ns is None:
+        return {}
+    return _station_display_names(path, mtime_ns)
+
+# 车站搜索索引：(展示名称, 小写原始名称)列表，按(路径, 修改时间)缓存
+# 数据不变时每次搜索无需再对全部车站做小写和替换
+@lru_cache(maxsize=2)
+def _station_search_index(path, mtime_ns):
+    stations = _load_station_data(path, mtime_ns)[0]['stations']
+    return tuple((station['name'].replace('|', ' '), station['name'].lower())
+                 for station in stations.values() if 'name' in station)
+
+# 车站ID到经过该车站的(线路下标, 站台编号)列表（按线路顺序，每条线路只记录一次，
+# 站台编号取该车站在线路中第一次出现时的name字段）的索引，
+# 按(路径, 修改时间)缓存，车站详情页无需每次扫描全部线路的站点
+@lru_cache(maxsize=2)
+def _station_route_index(path, mtime_ns):
+    index = {}
+    for i, route in enumerate(_load_station_data(path, mtime_ns)[0]['routes']):
+        if 'stations' not in route:
+            continue
+        platforms = {}
+        for station in route['stations']:
+            if isinstance(station, dict):
+                platforms.setdefault(station.get('id'), station.get('name', 'N/A'))
+        for station_id, platform in platforms.items():
+            index.setdefault(station_id, []).append((i, platform))
+    return index
+
+# 线路ID到线路下标的索引（ID重复时取第一条线路），按(路径, 修改时间)缓存
+@lru_cache(maxsize=2)
+def _route_id_index(path, mtime_ns):
+    index = {}
+    for i, route in enumerate(_load_station_data(path, mtime_ns)[0]['routes']):
+        if 'id' in route:
+            index.setdefault(route['id'], i)
+    return index
+
+# 每条线路拆分后的(主名称, 交路编号)，与线路列表下标对应，没有名称的线路为None，
+# 按(路径, 修改时间)缓存
+@lru_cache(maxsize=2)
+def _route_name_parts(path, mtime_ns):
+    return [_clean_route_name(route['name'])
+            if 'name' in route else None
+            for route in _load_station_data(path, mtime_ns)[0]['routes']]
+
+# 每条线路的原始主名称（||之前的部分，去除首尾空格，不替换竖杠），
+# 与线路列表下标对应，没有名称的线路为None，按(路径, 修改时间)缓存
+# 车站列表的线路数量统计和同名线路索引都以它区分线路
+@lru_cache(maxsize=2)
+def _route_main_names(path, mtime_ns):
+    return [route['name'].split('||', 1)[0].strip() if 'name' in route else None
+            for route in _load_station_data(path, mtime_ns)[0]['routes']]
+
+# 空查询的搜索结果（前10个车站）预先序列化为JSON，按(路径, 修改时间)缓存
+@lru_cache(maxsize=2)
+def _station_search_default(path, mtime_ns):
+    index = _station_search_index(path, mtime_ns)
+    return app.json.dumps([display_name for display_name, _ in index[:10]])
+
+# 线路原始主名称（||之前的部分，去除首尾空格）到同名线路交路信息列表的索引，
+# 按(路径, 修改时间)缓存，线路详情页直接查找同名线路，无需每次扫描全部线路
+# 列表中的交路信息在请求之间共享，只读
+@lru_cache(maxsize=2)
+def _same_name_route_index(path, mtime_ns):
+    index = {}
+    main_names = _route_main_names(path, mtime_ns)
+    name_parts = _route_name_parts(path, mtime_ns)
+    for i, route in enumerate(_load_station_data(path, mtime_ns)[0]['routes']):
+        if 'name' not in route:
+            continue
+        route_name = route['name']
+        route_info = {
+            'id': route.get('id', ''),
+            'name': route_name.replace('|', ' '),
+            'number': route.get('number', '')  # 添加线路编号
+        }
+        # 有交路编号时添加交路编号
+        if '||' in route_name:
+            route_info['route_number'] = name_parts[i][1]
+        index.setdefault(main_names[i], []).append(route_info)
+    return index
+
+# 原始禁路线的md5摘要（用于图缓存文件名），配置不变时直接复用
+# 与寻路库一致：对拼接后的字符串做一次摘要，等价于逐项update
+@lru_cache(maxsize=8)
+def ignored_lines_hash(lines):
+    return hashlib.md5(''.join(lines).encode('utf-8')).hexdigest()
+
+# 交路编号中的JSON调试信息（大括号包裹的内容）
+_RE_JSON_DEBUG = re.compile(r'\{.*?\}')
+
+# 拆分线路名称，返回(主名称, 交路编号)：单个竖杠替换为空格，
+# 交路编号移除JSON调试信息并去除多余空格，没有交路编号时为空字符串
+def _clean_route_name(name):
+    parts = name.split('||', 2)
+    main_name = parts[0].strip().replace('|', ' ')
+    if len(parts) == 1:
+        return main_name, ''
+    route_number = _RE_JSON_DEBUG.sub('', parts[1].strip()).replace('|', ' ')
+    return main_name, ' '.join(route_number.split())
+
+# 将整数颜色格式化为#rrggbb，没有颜色时返回None
+def format_color(color):
+    return f'#{color:06x}' if color else None
+
+# 颜色盒的背景色：颜色为0时同样显示为黑色，只有缺少颜色时返回None
+def format_box_color(color):
+    return f'#{color:06x}' if isinstance(color, int) else None
+
+# 将秒数格式化为运行时间：超过一小时显示为h:mm:ss，否则为mm:ss
+# 由divmod一次得到商和余数，各部分转换为整数，避免浮点数格式化错误
+def format_duration(seconds):
+    hours, remaining = divmod(seconds, 3600)
+    minutes, seconds = divmod(remaining, 60)
+    if hours > 0:
+        return f"{int(hours)}:{int(minutes):02d}:{int(seconds):02d}"
+    return f"{int(minutes):02d}:{int(seconds):02d}"
+
+# 为渲染好的页面计算ETag：页面同时取决于数据和配置，因此对内容本身取摘要
+def html_with_etag(html):
+    return html, hashlib.md5(html.encode('utf-8')).hexdigest()
+
+# Flask-Compress压缩响应时会在强ETag后追加算法后缀（如"<etag>:gzip"），
+# 浏览器带回的是带后缀的ETag，make_conditional无法匹配，每次验证都会重新压缩整个页面
+# 这里去掉后缀后比较，匹配时直接返回304（不压缩304响应），否则返回None
+def not_modified(etag):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    for client_etag in request.if_none_match:
+        if client_etag.split(':', 1)[0] == etag:
+            response = make_response('', 304)
+            # 返回浏览器持有的ETag，保持与之前压缩响应的ETag一致
+            response.set_etag(client_etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+    return None
+
+# 返回带ETag的页面，浏览器再次请求未变化的页面时直接返回304
+def conditional_html(html, etag):
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# 返回只取决于数据文件的响应：以文件修改时间作为ETag和Last-Modified，
+# 数据未变化时浏览器再次请求直接返回304
+def conditional_data(response, mtime_ns):
+    etag = f'{mtime_ns:x}'
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        unchanged.last_modified = mtime_ns // 1_000_000_000
+        return unchanged
+    response.set_etag(etag)
+    response.last_modified = mtime_ns // 1_000_000_000
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# 静态文件的内容版本号（md5前8位），文件内容变化后链接随之变化
+@lru_cache(maxsize=16)
+def static_version(filename):
+    with open(os.path.join(app.static_folder, filename), 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()[:8]
+
 @app.context_processor
 def inject_config():
-    return dict(config=config, request=request)
+    return dict(config=config, request=request, static_version=static_version)
+
+# 带版本号的静态文件内容不会变化，允许浏览器长期缓存
+@app.after_request
+def cache_versioned_static(response):
+    if request.endpoint == 'static' and request.args.get('v'):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
 
 # 专门处理favicon.ico请求
 @app.route('/favicon.ico')
@@ -160,217 +597,185 @@ def favicon():
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    html, etag = _render_index()
+    return conditional_html(html, etag)
+
+# 渲染首页：首页只取决于配置，配置修改时需调用cache_clear()
+@lru_cache(maxsize=1)
+def _render_index():
+    return html_with_etag(render_template('index.html'))
+
+# 预先生成车站和线路列表页面的视图数据以及车站搜索索引，
+# 把数据转换的开销放到数据更新时（或启动后的后台任务中）
+def warm_list_views():
+    data_file_path = config['LOCAL_FILE_PATH_V3']
+    mtime_ns = file_mtime_ns(data_file_path)
+    _stations_view(data_file_path, mtime_ns)
+    _routes_view(data_file_path, mtime_ns)
+    _station_search_index(data_file_path, mtime_ns)
+    _station_route_index(data_file_path, mtime_ns)
+    _route_name_parts(data_file_path, mtime_ns)
+    _same_name_route_index(data_file_path, mtime_ns)
+    _route_id_index(data_file_path, mtime_ns)
 
 @app.route('/stations')
 def stations():
-    # 读取车站数据和线路数据
-    stations_data = []
-    routes_data = []
     # 优先使用v3版本的数据文件，因为它包含更多信息
     data_file_path = config['LOCAL_FILE_PATH_V3']
-    if os.path.exists(data_file_path):
-        with open(data_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 统一处理，无论MTR_VER版本，都使用列表格式
-            if isinstance(data, list) and len(data) > 0:
-                stations_data = list(data[0]['stations'].values())
-                routes_data = data[0]['routes']
-            elif isinstance(data, dict):
-                # 如果是字典格式，将其转换为列表格式
-                stations_data = list(data['stations'].values())
-                routes_data = data['routes']
-    
-    # 创建车站ID到车站对象的映射
-    station_id_map = {}
-    for station in stations_data:
-        if isinstance(station, dict) and 'id' in station:
-            station_id_map[station['id']] = station
-            # 初始化routes属性为空列表
-            station['routes'] = []
+    html, etag = _render_stations(data_file_path, file_mtime_ns(data_file_path))
+    return conditional_html(html, etag)
+
+# 渲染车站列表页面，按(数据文件路径, 修改时间)缓存渲染结果和对应的ETag
+# 数据更新或配置修改时需调用cache_clear()
+@lru_cache(maxsize=2)
+def _render_stations(data_file_path, mtime_ns):
+    filtered_stations = _stations_view(data_file_path, mtime_ns)
+    return html_with_etag(render_template('stations.html', stations=filtered_stations))
+
+# 生成车站列表页面所需的视图数据，按(数据文件路径, 修改时间)缓存
+# 数据更新完成后由warm_list_views()预先生成
+@lru_cache(maxsize=2)
+def _stations_view(data_file_path, mtime_ns):
+    # 读取车站数据和线路数据
+    # 车站直接遍历字典的值视图，不再复制出一份完整的车站列表
+    stations_data = ()
+    routes_data = []
+    if mtime_ns is not None:
+        data = _load_station_data(data_file_path, mtime_ns)
+        stations_data = data[0]['stations'].values()
+        routes_data = data[0]['routes']
     
-    # 计算每个车站被多少条线路经过
-    for route in routes_data:
-        if isinstance(route, dict) and 'stations' in route:
-            for station in route['stations']:
-                if isinstance(station, dict) and 'id' in station:
-                    station_id = station['id']
-                    if station_id in station_id_map:
-                        # 将线路添加到车站的routes列表中
-                        station_id_map[station_id]['routes'].append(route)
-    
-    # 计算每个车站的线路数量（去重）和交路数量
-    for station in stations_data:
-        if isinstance(station, dict) and 'routes' in station:
-            # 交路数量 = routes列表长度
-            station['branch_count'] = len(station['routes'])
-            
-            # 线路数量 = 不同线路名称的数量
-            line_names = set()
-            for route in station['routes']:
-                if isinstance(route, dict) and 'name' in route:
-                    # 提取线路主名称（去除交路编号）
-                    route_name = route['name']
-                    if '||' in route_name:
-                        main_name = route_name.split('||')[0].strip()
-                    else:
-                        main_name = route_name.strip()
-                    line_names.add(main_name)
-            station['line_count'] = len(line_names)
+    # 车站ID到经过该车站的线路主名称列表的映射
+    # 数据为缓存中的共享对象，统计结果单独存放，不写回车站数据
+    station_routes = {station['id']: [] for station in stations_data
+                      if 'id' in station}
     
-    # 将车站名称中的竖杠替换为空格
-    for station in stations_data:
-        if isinstance(station, dict) and 'name' in station:
-            station['name'] = station['name'].replace('|', ' ')
+    # 计算每个车站被多少条线路经过
+    # 线路主名称（去除交路编号）使用预先拆分好的结果
+    main_names = _route_main_names(data_file_path, mtime_ns) if routes_data else ()
+    for route, main_name in zip(routes_data, main_names):
+        # 站点列表格式统一，每条线路只检查一次：非字典格式（MTR 3）不统计
+        route_stations = route.get('stations')
+        if not route_stations or not isinstance(route_stations[0], dict):
+            continue
+        for station in route_stations:
+            names = station_routes.get(station.get('id'))
+            if names is not None:
+                # 将线路添加到车站的线路列表中
+                names.append(main_name)
     
     # 数据字段过滤：只返回前端页面需要的字段
     filtered_stations = []
     for station in stations_data:
-        if isinstance(station, dict):
-            filtered_station = {
-                'id': station.get('id', 'N/A'),
-                'name': station.get('name', 'N/A'),
-                'line_count': station.get('line_count', 0),
-                'branch_count': station.get('branch_count', 0)
-            }
-            filtered_stations.append(filtered_station)
+        names = station_routes.get(station['id']) if 'id' in station else None
+        if names is None:
+            line_count = 0
+            branch_count = 0
+        else:
+            # 交路数量 = 线路列表长度
+            branch_count = len(names)
+            # 线路数量 = 不同线路名称的数量
+            line_count = len(set(names) - {None})
+        
+        filtered_stations.append({
+            'id': station.get('id', 'N/A'),
+            # 将车站名称中的竖杠替换为空格
+            'name': station['name'].replace('|', ' ') if 'name' in station else 'N/A',
+            'line_count': line_count,
+            'branch_count': branch_count
+        })
     
-    return render_template('stations.html', stations=filtered_stations)
+    return filtered_stations
 
 @app.route('/stations/<station_id>')
 def station_detail(station_id):
+    # 优先使用v3版本的数据文件，因为它包含更多信息
+    data_file_path = config['LOCAL_FILE_PATH_V3']
+    page = _render_station_detail(data_file_path, file_mtime_ns(data_file_path), station_id)
+    # 如果没有找到车站数据，返回404
+    if page is None:
+        return render_template('error.html', message='车站不存在'), 404
+    html, etag = page
+    return conditional_html(html, etag)
+
+# 渲染车站详情页面，按(数据文件路径, 修改时间, 车站ID)缓存渲染结果和对应的ETag，
+# 车站不存在时返回None；数据更新后修改时间变化，自动使用新的缓存项
+# 配置修改时需调用cache_clear()
+@lru_cache(maxsize=256)
+def _render_station_detail(data_file_path, mtime_ns, station_id):
     # 读取车站数据
     station_data = None
     routes_data = []
-    # 优先使用v3版本的数据文件，因为它包含更多信息
-    data_file_path = config['LOCAL_FILE_PATH_V3']
-    if os.path.exists(data_file_path):
-        with open(data_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 统一处理，无论MTR_VER版本，都使用列表格式
-            if isinstance(data, list) and len(data) > 0:
-                # 获取车站数据
-                stations = data[0]['stations']
-                if station_id in stations:
-                    station_data = stations[station_id]
-                # 获取线路数据
-                routes_data = data[0]['routes']
-            elif isinstance(data, dict):
-                # 兼容旧格式
-                if 'stations' in data and station_id in data['stations']:
-                    station_data = data['stations'][station_id]
-                if 'routes' in data:
-                    routes_data = data['routes']
+    # 数据来自内存缓存并在请求之间共享，需要修改的车站和线路先浅拷贝
+    if mtime_ns is not None:
+        data = _load_station_data(data_file_path, mtime_ns)
+        station_data = data[0]['stations'].get(station_id)
+        routes_data = data[0]['routes']
     
     # 不再使用v4版本数据文件
     
-    # 如果仍然没有找到车站数据，返回404
+    # 如果仍然没有找到车站数据，返回None（由调用方返回404）
     if not station_data:
-        return render_template('error.html', message='车站不存在'), 404
+        return None
     
-    # 将车站名称中的竖杠替换为空格
-    if isinstance(station_data, dict) and 'name' in station_data:
-        station_data['name'] = station_data['name'].replace('|', ' ')
+    # 车站ID到展示名称的映射（已将竖杠替换为空格），数据加载后只计算一次
+    station_names = _station_display_names(data_file_path, mtime_ns)
+    
+    # 使用车站的展示名称（竖杠替换为空格）
+    if 'name' in station_data:
+        station_data = station_data.copy()
+        station_data['name'] = station_names[station_id]
     
     # 获取所有车站数据
-    all_stations = {}
-    if isinstance(data, list) and len(data) > 0 and 'stations' in data[0]:
-        all_stations = data[0]['stations']
-    elif isinstance(data, dict) and 'stations' in data:
-        all_stations = data['stations']
+    all_stations = data[0]['stations']
     
     # 查找该车站所在的线路
     station_routes = []
-    for route in routes_data:
-        if isinstance(route, dict) and 'stations' in route:
-            for station in route['stations']:
-                if isinstance(station, dict) and station.get('id') == station_id:
-                    # 处理线路名称，将名称和交路编号分开
-                    if 'name' in route:
-                        route_name = route['name']
-                        # 检查是否包含双竖杠分隔符
-                        if '||' in route_name:
-                            # 分割线路名称和交路编号
-                            name_parts = route_name.split('||')
-                            # 将名称中的单个竖杠替换为空格
-                            route['name'] = name_parts[0].strip().replace('|', ' ')
-                            # 处理交路编号
-                            if len(name_parts) > 1:
-                                route_number = name_parts[1].strip()
-                                # 移除JSON调试信息（大括号包裹的内容）
-                                route_number = re.sub(r'\{.*?\}', '', route_number)
-                                # 将单个竖杠替换为空格
-                                route_number = route_number.replace('|', ' ')
-                                # 去除多余空格
-                                route_number = ' '.join(route_number.split())
-                                route['route_number'] = route_number
-                            else:
-                                route['route_number'] = ''
-                        else:
-                            # 没有交路编号，只保留名称
-                            route['name'] = route_name.strip().replace('|', ' ')
-                            route['route_number'] = ''
+    # 预先拆分好的线路名称，与线路列表下标对应
+    name_parts = _route_name_parts(data_file_path, mtime_ns)
+    # 由预先建立的索引直接取出经过该车站的线路（按线路顺序）及当前车站的站台编号，
+    # 不再逐条线路扫描站点
+    for route_index, current_platform in _station_route_index(
+            data_file_path, mtime_ns).get(station_id, ()):
+        # 以下会修改线路的名称、交路编号和站点列表，只修改副本
+        route = routes_data[route_index].copy()
+        # 处理线路名称，将名称和交路编号分开
+        if 'name' in route:
+            route['name'], route['route_number'] = name_parts[route_index]
                     
-                    # 处理站点列表，添加站点名称和运行时间
-                    processed_stations = []
-                    durations = route.get('durations', [])
+        # 处理站点列表：页面只显示站点的ID和名称，直接生成只含这两个字段的新字典
+        # 批量解析站点展示名称：由map逐个查找映射，找不到时为None
+        # 能匹配到当前车站说明站点列表为字典格式，无需逐项判断类型
+        route_stations = route['stations']
+        display_names = map(station_names.get,
+                            [x.get('id') for x in route_stations])
+        processed_stations = [
+            {'id': route_station.get('id', ''),
+             # 如果能找到对应的车站数据，使用车站名称
+             'name': (display_name if display_name is not None
+                      else route_station.get('name', 'N/A'))}
+            for route_station, display_name in zip(route_stations, display_names)]
                     
-                    # 查找当前车站在该线路中的站台编号
-                    current_platform = 'N/A'
-                    for route_station in route['stations']:
-                        if isinstance(route_station, dict) and route_station.get('id') == station_id:
-                            # 使用原始站点数据中的name字段作为站台编号
-                            current_platform = route_station.get('name', 'N/A')
-                            break
-                    
-                    for i, route_station in enumerate(route['stations']):
-                        if isinstance(route_station, dict):
-                            # 深拷贝，避免修改原始数据
-                            processed_station = route_station.copy()
-                            # 获取站点ID
-                            route_station_id = processed_station.get('id')
-                            # 如果能找到对应的车站数据，替换为车站名称
-                            if route_station_id in all_stations:
-                                # 使用临时变量存储线路站点数据，避免覆盖原始车站数据
-                                route_station_data = all_stations[route_station_id]
-                                # 将车站名称中的竖杠替换为空格
-                                if 'name' in route_station_data:
-                                    processed_station['name'] = route_station_data['name'].replace('|', ' ')
-                            
-                            # 添加运行时间信息：durations[i]是从当前站点到下一个站点的运行时间
-                            if i < len(durations):
-                                # 将秒转换为适当的格式：超过一小时显示为h:mm:ss，否则为mm:ss
-                                seconds = durations[i]
-                                # 转换为整数，避免浮点数格式化错误
-                                hours = int(seconds // 3600)
-                                minutes = int((seconds % 3600) // 60)
-                                remaining_seconds = int(seconds % 60)
-                                
-                                if hours > 0:
-                                    processed_station['travel_time'] = f"{hours}:{minutes:02d}:{remaining_seconds:02d}"
-                                else:
-                                    processed_station['travel_time'] = f"{minutes:02d}:{remaining_seconds:02d}"
-                            
-                            processed_stations.append(processed_station)
-                    
-                    # 将当前车站的站台编号添加到线路数据中
-                    route['current_platform'] = current_platform
-                    # 更新线路的站点列表
-                    route['stations'] = processed_stations
+        # 将当前车站的站台编号添加到线路数据中
+        route['current_platform'] = current_platform
+        # 更新线路的站点列表
+        route['stations'] = processed_stations
                     
-                    station_routes.append(route)
-                    break
+        station_routes.append(route)
     
     # 将线路按主名称分组
     grouped_routes = {}
     for route in station_routes:
         route_name = route.get('name', 'N/A')
-        if route_name not in grouped_routes:
-            grouped_routes[route_name] = {
+        # 每条线路只查找一次分组
+        group = grouped_routes.get(route_name)
+        if group is None:
+            group = grouped_routes[route_name] = {
                 'main_route': route,  # 使用第一条线路作为主线路信息
-                'routes': []
+                'routes': [],
+                'box_color': format_box_color(route.get('color'))
             }
-        grouped_routes[route_name]['routes'].append(route)
+        group['routes'].append(route)
     
     # 转换为列表格式便于模板处理
     grouped_routes_list = list(grouped_routes.values())
@@ -381,67 +786,38 @@ def station_detail(station_id):
         for connection_id in station_data['connections']:
             if connection_id in all_stations:
                 connected_station = all_stations[connection_id].copy()
-                # 将车站名称中的竖杠替换为空格
+                # 使用车站的展示名称（竖杠替换为空格）
                 if 'name' in connected_station:
-                    connected_station['name'] = connected_station['name'].replace('|', ' ')
+                    connected_station['name'] = station_names[connection_id]
+                connected_station['box_color'] = format_box_color(connected_station.get('color'))
                 connected_stations.append(connected_station)
     
-    return render_template('station_detail.html', station=station_data, grouped_routes=grouped_routes_list, station_id=station_id, connected_stations=connected_stations)
+    return html_with_etag(render_template('station_detail.html', station=station_data, grouped_routes=grouped_routes_list, station_id=station_id, connected_stations=connected_stations, color_hex=format_color(station_data.get('color')), box_color=format_box_color(station_data.get('color'))))
 
 @app.route('/routes')
 def routes():
-    # 读取线路数据
-    routes_data = []
     # 优先使用v3版本的数据文件，因为它包含更多信息
     data_file_path = config['LOCAL_FILE_PATH_V3']
-    if os.path.exists(data_file_path):
-        with open(data_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 统一处理，无论MTR_VER版本，都使用列表格式
-            if isinstance(data, list) and len(data) > 0:
-                # 检查data[0]['routes']是否为字典，如果是则转换为列表
-                if isinstance(data[0]['routes'], dict):
-                    routes_data = list(data[0]['routes'].values())
-                else:
-                    routes_data = data[0]['routes']
-            elif isinstance(data, dict):
-                # 如果是字典格式，将其转换为列表格式
-                routes_data = list(data['routes'].values())
-    
-    # 读取interval数据文件，用于搜索功能
-    interval_data = {}
-    interval_file_path = config['INTERVAL_PATH_V3']
-    if os.path.exists(interval_file_path):
-        with open(interval_file_path, 'r', encoding='utf-8') as f:
-            interval_data = json.load(f)
-    
-    # 处理线路名称，将名称和交路编号分开
-    import re
-    for route in routes_data:
-        if isinstance(route, dict) and 'name' in route:
-            route_name = route['name']
-            # 检查是否包含双竖杠分隔符
-            if '||' in route_name:
-                # 分割线路名称和交路编号
-                name_parts = route_name.split('||')
-                # 将名称中的单个竖杠替换为空格
-                route['name'] = name_parts[0].strip().replace('|', ' ')
-                # 处理交路编号
-                if len(name_parts) > 1:
-                    route_number = name_parts[1].strip()
-                    # 移除JSON调试信息（大括号包裹的内容）
-                    route_number = re.sub(r'\{.*?\}', '', route_number)
-                    # 将单个竖杠替换为空格
-                    route_number = route_number.replace('|', ' ')
-                    # 去除多余空格
-                    route_number = ' '.join(route_number.split())
-                    route['route_number'] = route_number
-                else:
-                    route['route_number'] = ''
-            else:
-                # 没有交路编号，只保留名称
-                route['name'] = route_name.strip().replace('|', ' ')
-                route['route_number'] = ''
+    html, etag = _render_routes(data_file_path, file_mtime_ns(data_file_path))
+    return conditional_html(html, etag)
+
+# 渲染线路列表页面，按(数据文件路径, 修改时间)缓存渲染结果和对应的ETag
+# 列表页面不使用发车间隔数据，不再读取interval数据文件
+# 数据更新或配置修改时需调用cache_clear()
+@lru_cache(maxsize=2)
+def _render_routes(data_file_path, mtime_ns):
+    filtered_routes, line_count, branch_count = _routes_view(data_file_path, mtime_ns)
+    
+    return html_with_etag(render_template('routes.html', routes=filtered_routes, line_count=line_count, branch_count=branch_count))
+
+# 生成线路列表页面所需的视图数据，按(数据文件路径, 修改时间)缓存
+# 返回(线路列表, 线路总数, 交路总数)，数据更新完成后由warm_list_views()预先生成
+@lru_cache(maxsize=2)
+def _routes_view(data_file_path, mtime_ns):
+    # 读取线路数据
+    routes_data = []
+    if mtime_ns is not None:
+        routes_data = _load_station_data(data_file_path, mtime_ns)[0]['routes']
     
     # 计算线路总数和交路总数，模仿车站详情页的统计逻辑
     # 交路总数 = 所有线路的数量
@@ -449,179 +825,129 @@ def routes():
     
     # 线路总数 = 不同线路主名称的数量（去除交路编号）
     line_names = set()
-    for route in routes_data:
-        if isinstance(route, dict) and 'name' in route:
-            # 提取线路主名称（这里已经处理过，直接使用name字段）
-            line_names.add(route['name'])
-    line_count = len(line_names)
     
     # 数据字段过滤：只返回前端页面需要的字段
+    # 线路数据为缓存中的共享对象，处理后的名称和交路编号只写入返回的字典
+    # 线路名称和交路编号使用预先拆分好的结果
+    name_parts = _route_name_parts(data_file_path, mtime_ns) if routes_data else ()
     filtered_routes = []
-    for route in routes_data:
-        if isinstance(route, dict):
-            # 只计算车站数量，不传递完整的车站列表
-            stations = route.get('stations', [])
-            station_count = len(stations)
-            
-            filtered_route = {
-                'id': route.get('id', 'N/A'),
-                'name': route.get('name', 'N/A'),
-                'route_number': route.get('route_number', ''),
-                'number': route.get('number', ''),
-                'station_count': station_count
-            }
-            filtered_routes.append(filtered_route)
+    for route, parts in zip(routes_data, name_parts):
+        name = route.get('name', 'N/A')
+        route_number = route.get('route_number', '')
+        # 处理线路名称，将名称和交路编号分开
+        if parts is not None:
+            name, route_number = parts
+            line_names.add(name)
+        
+        # 只计算车站数量，不传递完整的车站列表
+        stations = route.get('stations', [])
+        station_count = len(stations)
+        
+        filtered_route = {
+            'id': route.get('id', 'N/A'),
+            'name': name,
+            'route_number': route_number,
+            'number': route.get('number', ''),
+            'station_count': station_count
+        }
+        filtered_routes.append(filtered_route)
+    line_count = len(line_names)
     
-    return render_template('routes.html', routes=filtered_routes, interval_data=interval_data, line_count=line_count, branch_count=branch_count)
+    return filtered_routes, line_count, branch_count
 
 @app.route('/routes/<route_id>')
 def route_detail(route_id):
-    # 读取线路数据
-    route_data = None
-    all_stations = {}
-    all_routes_data = []
-    same_name_routes = []  # 初始化same_name_routes，避免UnboundLocalError
     # 优先使用v3版本的数据文件，因为它包含更多信息
     data_file_path = config['LOCAL_FILE_PATH_V3']
-    if os.path.exists(data_file_path):
-        with open(data_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 统一处理，无论MTR_VER版本，都使用列表格式
-            if isinstance(data, list) and len(data) > 0:
-                # 获取车站数据
-                all_stations = data[0]['stations']
-                # 获取线路数据
-                routes_data = data[0]['routes']
-                # 转换为列表格式便于处理
-                if isinstance(routes_data, dict):
-                    all_routes_data = list(routes_data.values())
-                else:
-                    all_routes_data = routes_data
-                # 查找指定线路
-                for route in all_routes_data:
-                    if isinstance(route, dict) and route.get('id') == route_id:
-                        route_data = route
-                        break
-            elif isinstance(data, dict):
-                # 兼容旧格式
-                all_stations = data.get('stations', {})
-                routes_data = data.get('routes', {})
-                # 转换为列表格式便于处理
-                if isinstance(routes_data, dict):
-                    all_routes_data = list(routes_data.values())
-                else:
-                    all_routes_data = routes_data
-                # 查找指定线路
-                for route in all_routes_data:
-                    if isinstance(route, dict) and route.get('id') == route_id:
-                        route_data = route
-                        break
-    
+    interval_path = config['INTERVAL_PATH_V3']
+    page = _render_route_detail(data_file_path, file_mtime_ns(data_file_path),
+                                interval_path, file_mtime_ns(interval_path), route_id)
     # 如果没有找到线路数据，返回404
-    if not route_data:
+    if page is None:
         return render_template('error.html', message='线路不存在'), 404
+    html, etag = page
+    return conditional_html(html, etag)
+
+# 渲染线路详情页面，按两个数据文件的(路径, 修改时间)和线路ID缓存渲染结果和对应的ETag，
+# 线路不存在时返回None；数据更新后修改时间变化，自动使用新的缓存项
+# 配置修改时需调用cache_clear()
+@lru_cache(maxsize=256)
+def _render_route_detail(data_file_path, mtime_ns, interval_path, interval_mtime_ns, route_id):
+    # 读取线路数据
+    route_data = None
+    same_name_routes = []  # 初始化same_name_routes，避免UnboundLocalError
+    # 数据来自内存缓存并在请求之间共享，找到的线路浅拷贝后再添加展示字段
+    if mtime_ns is not None:
+        # 由预先建立的索引直接查找指定线路，不再逐条线路比较ID
+        route_index = _route_id_index(data_file_path, mtime_ns).get(route_id)
+        if route_index is not None:
+            data = _load_station_data(data_file_path, mtime_ns)
+            route_data = data[0]['routes'][route_index].copy()
+    
+    # 如果没有找到线路数据，返回None（由调用方返回404）
+    if not route_data:
+        return None
     
-    import re
-    # 处理线路名称，分割主线路名称和交路编号
-    if isinstance(route_data, dict) and 'name' in route_data:
-        original_name = route_data['name']
-        # 分割主线路名称和交路编号
-        if '||' in original_name:
-            main_name = original_name.split('||')[0].strip()
-            route_data['main_name'] = main_name.replace('|', ' ')
-        else:
-            route_data['main_name'] = original_name.replace('|', ' ')
-        
-        # 处理交路编号
-        route_number = ''
-        if '||' in original_name:
-            route_number = original_name.split('||')[1].strip()
-            # 移除JSON调试信息（大括号包裹的内容）
-            route_number = re.sub(r'\{.*?\}', '', route_number)
-            # 将单个竖杠替换为空格
-            route_number = route_number.replace('|', ' ')
-            # 去除多余空格
-            route_number = ' '.join(route_number.split())
-        route_data['route_number'] = route_number
+    # 处理线路名称：使用预先拆分好的主线路名称和交路编号
+    if 'name' in route_data:
+        route_data['main_name'], route_data['route_number'] = \
+            _route_name_parts(data_file_path, mtime_ns)[route_index]
     
     # 处理站点列表，添加站点名称和运行时间
     processed_stations = []
     durations = route_data.get('durations', [])
-    if isinstance(route_data, dict) and 'stations' in route_data:
+    # 车站ID到展示名称的映射（已将竖杠替换为空格）
+    station_names = station_display_names(data_file_path)
+    route_stations = []
+    if 'stations' in route_data:
+        route_stations = route_data['stations']
+    # 站点列表格式统一，只检查一次：非字典格式（MTR 3）不处理
+    if route_stations and isinstance(route_stations[0], dict):
         total_seconds = 0  # 累计运行时长（秒）
-        for i, route_station in enumerate(route_data['stations']):
-            if isinstance(route_station, dict):
-                # 深拷贝，避免修改原始数据
-                processed_station = route_station.copy()
-                # 获取站点ID
-                route_station_id = processed_station.get('id')
-                # 如果能找到对应的车站数据，替换为车站名称
-                if route_station_id in all_stations:
-                    station_data = all_stations[route_station_id]
-                    # 将车站名称中的竖杠替换为空格
-                    if 'name' in station_data:
-                        processed_station['name'] = station_data['name'].replace('|', ' ')
-                
-                # 处理停靠站台：使用原始站点数据中的name字段作为站台编号
-                processed_station['platform'] = route_station.get('name', 'N/A')
-                
-                # 处理停站时长：将毫秒转换为秒格式
-                dwell_time_ms = processed_station.get('dwellTime', 0)
-                dwell_seconds = int(dwell_time_ms / 1000)
-                processed_station['dwell_time'] = f"{dwell_seconds}秒"
-                
-                # 处理累计运行时长：转换为适当的格式：超过一小时显示为h:mm:ss，否则为mm:ss
-                total_hours = int(total_seconds // 3600)
-                total_minutes = int((total_seconds % 3600) // 60)
-                total_remaining_seconds = int(total_seconds % 60)
-                
-                if total_hours > 0:
-                    processed_station['total_time'] = f"{total_hours}:{total_minutes:02d}:{total_remaining_seconds:02d}"
-                else:
-                    processed_station['total_time'] = f"{total_minutes:02d}:{total_remaining_seconds:02d}"
-                
-                # 添加运行时间信息：durations[i]是从当前站点到下一个站点的运行时间
-                if i < len(durations):
-                    # 将秒转换为适当的格式：超过一小时显示为h:mm:ss，否则为mm:ss
-                    seconds = durations[i]
-                    # 转换为整数，避免浮点数格式化错误
-                    hours = int(seconds // 3600)
-                    minutes = int((seconds % 3600) // 60)
-                    remaining_seconds = int(seconds % 60)
-                    
-                    if hours > 0:
-                        processed_station['travel_time'] = f"{hours}:{minutes:02d}:{remaining_seconds:02d}"
-                    else:
-                        processed_station['travel_time'] = f"{minutes:02d}:{remaining_seconds:02d}"
-                    
-                    # 计算累计运行时长（不包括当前站点的停站时间）
-                    # 将当前站点到下一站的运行时间加到累计时间中
-                    total_seconds += seconds
+        # 批量解析站点展示名称：由map逐个查找映射，找不到时为None
+        display_names = map(station_names.get,
+                            [x.get('id') for x in route_stations])
+        for i, (route_station, display_name) in enumerate(
+                zip(route_stations, display_names)):
+            # 只生成页面需要的字段，不再复制原始站点数据的全部字段
+            platform = route_station.get('name', 'N/A')
+            processed_station = {
+                'id': route_station.get('id', ''),
+                # 如果能找到对应的车站数据，使用车站名称
+                'name': display_name if display_name is not None else platform,
+                # 停靠站台：使用原始站点数据中的name字段作为站台编号
+                'platform': platform,
+                # 停站时长：将毫秒转换为秒格式
+                'dwell_time': f"{int(route_station.get('dwellTime', 0) / 1000)}秒",
+                # 累计运行时长：超过一小时显示为h:mm:ss，否则为mm:ss
+                'total_time': format_duration(total_seconds),
+            }
+            
+            # 添加运行时间信息：durations[i]是从当前站点到下一个站点的运行时间
+            if i < len(durations):
+                # 将秒转换为适当的格式：超过一小时显示为h:mm:ss，否则为mm:ss
+                seconds = durations[i]
+                processed_station['travel_time'] = format_duration(seconds)
                 
-                processed_stations.append(processed_station)
+                # 计算累计运行时长（不包括当前站点的停站时间）
+                # 将当前站点到下一站的运行时间加到累计时间中
+                total_seconds += seconds
+            
+            processed_stations.append(processed_station)
+    if route_stations:
         # 更新线路的站点列表
         route_data['stations'] = processed_stations
     
     # 计算总运行时间
     if durations:
-        total_runtime_seconds = sum(durations)
-        total_runtime_hours = int(total_runtime_seconds // 3600)
-        total_runtime_minutes = int((total_runtime_seconds % 3600) // 60)
-        total_runtime_remaining_seconds = int(total_runtime_seconds % 60)
-        
-        if total_runtime_hours > 0:
-            route_data['total_runtime'] = f"{total_runtime_hours}:{total_runtime_minutes:02d}:{total_runtime_remaining_seconds:02d}"
-        else:
-            route_data['total_runtime'] = f"{total_runtime_minutes:02d}:{total_runtime_remaining_seconds:02d}"
+        route_data['total_runtime'] = format_duration(sum(durations))
     else:
         route_data['total_runtime'] = "00:00"
     
-    # 读取interval数据文件，获取发车间隔
+    # 读取interval数据文件（内存缓存，只读），获取发车间隔
     interval_data = {}
-    interval_file_path = config['INTERVAL_PATH_V3']
-    if os.path.exists(interval_file_path):
-        with open(interval_file_path, 'r', encoding='utf-8') as f:
-            interval_data = json.load(f)
+    if interval_mtime_ns is not None:
+        interval_data = _load_raw(interval_path, interval_mtime_ns) or {}
     
     # 提取车厂信息（如果线路数据中包含）
     if 'depots' in route_data and isinstance(route_data['depots'], list) and route_data['depots']:
@@ -636,129 +962,39 @@ def route_detail(route_id):
     
     # 如果找到的是数字，转换为可读格式（秒 -> mm:ss 或 h:mm:ss）
     if isinstance(route_data['interval'], int):
-        total_seconds = route_data['interval']
-        hours = int(total_seconds // 3600)
-        remaining_seconds = int(total_seconds % 3600)
-        minutes = int(remaining_seconds // 60)
-        seconds = int(remaining_seconds % 60)
-        
-        if hours > 0:
-            # 超过一小时，格式为 h:mm:ss
-            route_data['interval'] = f"{hours}:{minutes:02d}:{seconds:02d}"
-        else:
-            # 不足一小时，格式为 mm:ss
-            route_data['interval'] = f"{minutes:02d}:{seconds:02d}"
-    
-    # 查找所有同名线路的交路
-    same_name_routes = []
-    for route in all_routes_data:
-        if isinstance(route, dict) and 'name' in route:
-            # 提取主线路名称
-            route_name = route['name']
-            if '||' in route_name:
-                route_main_name = route_name.split('||')[0].strip()
-            else:
-                route_main_name = route_name.strip()
-            
-            # 比较主线路名称
-            if route_main_name == (original_name.split('||')[0].strip() if '||' in original_name else original_name.strip()):
-                # 处理交路信息
-                route_info = {
-                    'id': route.get('id', ''),
-                    'name': route_name.replace('|', ' '),
-                    'number': route.get('number', '')  # 添加线路编号
-                }
-                # 添加交路编号
-                if '||' in route_name:
-                    route_number = route_name.split('||')[1].strip()
-                    # 移除JSON调试信息
-                    route_number = re.sub(r'\{.*?\}', '', route_number)
-                    # 清理交路编号
-                    route_number = route_number.replace('|', ' ')
-                    route_number = ' '.join(route_number.split())
-                    route_info['route_number'] = route_number
-                same_name_routes.append(route_info)
-    
-    return render_template('route_detail.html', route=route_data, same_name_routes=same_name_routes)
+        route_data['interval'] = format_duration(route_data['interval'])
+    
+    # 由预先建立的索引查找所有同名线路的交路
+    if 'name' in route_data:
+        same_name_routes = _same_name_route_index(data_file_path, mtime_ns).get(
+            _route_main_names(data_file_path, mtime_ns)[route_index], [])
+    
+    return html_with_etag(render_template('route_detail.html', route=route_data, same_name_routes=same_name_routes, color_hex=format_color(route_data.get('color')), box_color=format_box_color(route_data.get('color'))))
 
 
 
 @app.route('/admin', methods=['GET', 'POST'])
 def admin():
+    error = None
     if request.method == 'POST':
         # 处理登录请求
         password = request.form.get('password')
         if password == config['CONSOLE_PASSWORD']:
             session['admin_logged_in'] = True
             return redirect('/admin')
-        else:
-            # 获取文件版本信息
-            station_version = ""
-            station_version_v4 = ""
-            route_version_v4 = ""
-            interval_version = ""
-            
-            if os.path.exists(config['LOCAL_FILE_PATH_V3']):
-                station_version = datetime.fromtimestamp(
-                    os.path.getmtime(config['LOCAL_FILE_PATH_V3'])
-                ).strftime('%Y%m%d-%H%M')
-            if os.path.exists(config['LOCAL_FILE_PATH_V4']):
-                station_version_v4 = datetime.fromtimestamp(
-                    os.path.getmtime(config['LOCAL_FILE_PATH_V4'])
-                ).strftime('%Y%m%d-%H%M')
-            if os.path.exists(config['DEP_PATH_V4']):
-                route_version_v4 = datetime.fromtimestamp(
-                    os.path.getmtime(config['DEP_PATH_V4'])
-                ).strftime('%Y%m%d-%H%M')
-            if os.path.exists(config['INTERVAL_PATH_V3']):
-                interval_version = datetime.fromtimestamp(
-                    os.path.getmtime(config['INTERVAL_PATH_V3'])
-                ).strftime('%Y%m%d-%H%M')
-            
-            return render_template('admin.html', 
-                           config=config, 
-                           station_version=station_version,
-                           station_version_v4=station_version_v4,
-                           route_version_v4=route_version_v4,
-                           interval_version=interval_version,
-                           route_search_count=route_search_count,
-                           error='密码错误')
+        error = '密码错误'
     
-    # GET请求，检查是否已登录
+    # 未登录时只显示登录表单，不需要读取文件版本信息
     if not session.get('admin_logged_in'):
-        return render_template('admin.html', error=None, route_search_count=route_search_count)
+        return render_template('admin.html', error=error, route_search_count=route_search_count)
     
     # 已登录，显示控制台内容
     # 获取文件版本信息
-    station_version = ""
-    station_version_v4 = ""
-    route_version_v4 = ""
-    interval_version = ""
-    
-    if os.path.exists(config['LOCAL_FILE_PATH_V3']):
-        station_version = datetime.fromtimestamp(
-            os.path.getmtime(config['LOCAL_FILE_PATH_V3'])
-        ).strftime('%Y%m%d-%H%M')
-    if os.path.exists(config['LOCAL_FILE_PATH_V4']):
-        station_version_v4 = datetime.fromtimestamp(
-            os.path.getmtime(config['LOCAL_FILE_PATH_V4'])
-        ).strftime('%Y%m%d-%H%M')
-    if os.path.exists(config['DEP_PATH_V4']):
-        route_version_v4 = datetime.fromtimestamp(
-            os.path.getmtime(config['DEP_PATH_V4'])
-        ).strftime('%Y%m%d-%H%M')
-    if os.path.exists(config['INTERVAL_PATH_V3']):
-        interval_version = datetime.fromtimestamp(
-            os.path.getmtime(config['INTERVAL_PATH_V3'])
-        ).strftime('%Y%m%d-%H%M')
-    
     return render_template('admin.html', 
                            config=config, 
-                           station_version=station_version,
-                           station_version_v4=station_version_v4,
-                           route_version_v4=route_version_v4,
-                           interval_version=interval_version,
-                           route_search_count=route_search_count)
+                           **get_data_versions(),
+                           route_search_count=route_search_count,
+                           error=error)
 
 @app.route('/admin/logout', methods=['POST'])
 def admin_logout():
@@ -792,12 +1028,38 @@ def api_find_route():
     if not all(key in data for key in ['start', 'end']):
         return jsonify({'error': '缺少必要参数'}), 400
     
-    # 准备参数
+    # 明显无效的输入直接返回，不再加载数据和建图
+    start, end = data['start'], data['end']
+    if not start or not end:
+        return jsonify({'error': '请填写起点和终点'}), 400
+    if start == end:
+        return jsonify({'error': '起点和终点相同'}), 400
+    avoid_stations = data.get('avoid_stations', [])
+    if start in avoid_stations or end in avoid_stations:
+        return jsonify({'error': '起点和终点不能设为避开的车站'}), 400
+    
+    # 准备参数：一次性读取寻路选项，各分支直接使用
     algorithm = data.get('algorithm', 'default')
+    ignored_lines = data.get('ignored_lines', [])
+    only_lines = data.get('only_lines', [])
+    disable_high_speed = data.get('disable_high_speed', False)
+    disable_boat = data.get('disable_boat', False)
+    enable_wild = data.get('enable_wild', False)
+    only_lrt = data.get('only_lrt', False)
     
     # 初始化变量来存储实际使用的出发时间
     actual_departure_time = None
     
+    # 实时寻路的出发时间参数
+    dep_time_seconds = None
+    if algorithm == 'real':
+        dep_time_seconds = data.get('dep_time')
+        client_time = data.get('client_time')
+        
+        # 如果dep_time_seconds为None且提供了客户端时间，使用客户端时间+10秒作为出发时间
+        if dep_time_seconds is None and client_time is not None:
+            dep_time_seconds = (client_time + 10) % 86400
+    
     # 更新进度
     search_progress.update({
         'percentage': 5,
@@ -819,6 +1081,41 @@ def api_find_route():
         if not os.path.exists(config['INTERVAL_PATH_V3']):
             return jsonify({'error': '间隔数据不存在，请先更新数据'}), 400
     
+    # 寻路结果缓存的键：寻路参数和所用数据文件的修改时间，数据文件变化后自动使用新的键
+    # 实时寻路未指定出发时间时，寻路库使用当前时间出发，结果随时间变化，不使用缓存
+    result_key = None
+    if algorithm != 'real' or dep_time_seconds is not None:
+        if algorithm == 'real':
+            data_paths = (config['LOCAL_FILE_PATH_V4'], config['DEP_PATH_V4'])
+        else:
+            data_paths = (config['LOCAL_FILE_PATH_V3'], config['INTERVAL_PATH_V3'])
+        result_key = app.json.dumps([
+            algorithm, start, end, ignored_lines, only_lines, avoid_stations,
+            disable_high_speed, disable_boat, enable_wild, only_lrt,
+            data.get('detail', True) if algorithm != 'real' else None,
+            dep_time_seconds, [file_mtime_ns(path) for path in data_paths]])
+    
+    # 相同的寻路请求已有结果时直接返回，只需为图片生成新的标识符
+    cached_result = get_route_result(result_key) if result_key is not None else None
+    if cached_result is not None:
+        image_id = str(uuid.uuid4())
+        # 图片数据只读，可在多个标识符之间共享
+        image_cache[image_id] = {
+            'status': 'ready',
+            'algorithm': algorithm,
+            'data': cached_result['image_data'],
+            'image_path': None,
+            'image_base64': None
+        }
+        search_progress.update({
+            'percentage': 100,
+            'stage': '完成',
+            'message': '路径计算完成（使用已缓存的结果）'
+        })
+        return route_result_response(
+            algorithm, cached_result['result'], start_time, True, image_id,
+            cached_result['departure_time'])
+    
     # 更新进度
     search_progress.update({
         'percentage': 10,
@@ -838,14 +1135,6 @@ def api_find_route():
                 'message': '处理出发时间...'
             })
             
-            # 处理出发时间参数
-            dep_time_seconds = data.get('dep_time')
-            client_time = data.get('client_time')
-            
-            # 如果dep_time_seconds为None且提供了客户端时间，使用客户端时间+10秒作为出发时间
-            if dep_time_seconds is None and client_time is not None:
-                dep_time_seconds = (client_time + 10) % 86400
-            
             # 保存实际使用的出发时间
             actual_departure_time = dep_time_seconds
             
@@ -857,8 +1146,8 @@ def api_find_route():
 
             # 1. 生成gen_image=False条件下的数组结果
             result_gen_image_false = mtr_main_v4(
-                station1=data['start'],
-                station2=data['end'],
+                station1=start,
+                station2=end,
                 LINK=config['LINK'],
                 LOCAL_FILE_PATH=config['LOCAL_FILE_PATH_V4'],
                 DEP_PATH=config['DEP_PATH_V4'],
@@ -871,13 +1160,13 @@ def api_find_route():
                 ORIGINAL_IGNORED_LINES=config['ORIGINAL_IGNORED_LINES'],
                 UPDATE_DATA=False,
                 GEN_DEPARTURE=False,
-                IGNORED_LINES=data.get('ignored_lines', []),
-                ONLY_LINES=data.get('only_lines', []),
-                AVOID_STATIONS=data.get('avoid_stations', []),
-                CALCULATE_HIGH_SPEED=not data.get('disable_high_speed', False),
-                CALCULATE_BOAT=not data.get('disable_boat', False),
-                CALCULATE_WALKING_WILD=data.get('enable_wild', False),
-                ONLY_LRT=data.get('only_lrt', False),
+                IGNORED_LINES=ignored_lines,
+                ONLY_LINES=only_lines,
+                AVOID_STATIONS=avoid_stations,
+                CALCULATE_HIGH_SPEED=not disable_high_speed,
+                CALCULATE_BOAT=not disable_boat,
+                CALCULATE_WALKING_WILD=enable_wild,
+                ONLY_LRT=only_lrt,
                 DETAIL=False,
                 MAX_HOUR=config['MAX_HOUR'],
                 gen_image=False,
@@ -969,20 +1258,12 @@ def api_find_route():
             
             # 3. 将寻路结果和生成图片所需数据存储在缓存中，供后续图片生成使用
             # 生成唯一标识符
-            import uuid
             image_id = str(uuid.uuid4())
             
             # 获取数据版本信息
-            version1 = ''
-            version2 = ''
-            if os.path.exists(config['LOCAL_FILE_PATH_V4']):
-                version1 = datetime.fromtimestamp(
-                    os.path.getmtime(config['LOCAL_FILE_PATH_V4'])
-                ).strftime('%Y%m%d-%H%M')
-            if os.path.exists(config['DEP_PATH_V4']):
-                version2 = datetime.fromtimestamp(
-                    os.path.getmtime(config['DEP_PATH_V4'])
-                ).strftime('%Y%m%d-%H%M')
+            data_versions = get_data_versions()
+            version1 = data_versions['station_version_v4']
+            version2 = data_versions['route_version_v4']
             
             # 存储寻路结果和生成图片所需数据
             image_cache[image_id] = {
@@ -1019,42 +1300,32 @@ def api_find_route():
             IN_THEORY = algorithm == 'theory'
             DETAIL = data.get('detail', True)
             
-            # 加载数据文件，用于处理ert数据和获取版本信息
-            if os.path.exists(LOCAL_FILE_PATH):
-                with open(LOCAL_FILE_PATH, encoding='utf-8') as f:
-                    data_file = json.load(f)
-            else:
+            # 加载数据文件（内存缓存，只读），用于处理ert数据和获取版本信息
+            data_file = load_station_data(LOCAL_FILE_PATH)
+            if data_file is None:
                 return jsonify({'error': '车站数据不存在，请先更新数据'}), 400
             
             # 获取版本信息
-            version1 = ''
-            version2 = ''
-            if os.path.exists(LOCAL_FILE_PATH):
-                version1 = time.strftime('%Y%m%d-%H%M',
-                                        time.gmtime(os.path.getmtime(LOCAL_FILE_PATH)))
-            if os.path.exists(INTERVAL_PATH):
-                version2 = time.strftime('%Y%m%d-%H%M',
-                                        time.gmtime(os.path.getmtime(INTERVAL_PATH)))
+            version1 = file_version(LOCAL_FILE_PATH, utc=True)
+            version2 = file_version(INTERVAL_PATH, utc=True)
             
             # 设置寻路类型
             route_type = RouteTypeV3.IN_THEORY if IN_THEORY else RouteTypeV3.WAITING
             
             # 生成与 create_graph 函数完全一致的缓存文件名
-            import hashlib
-            m = hashlib.md5()
             # 注意：缓存文件名必须考虑原始禁路线，因为原始禁路线不同，生成的图也不同
-            for s in config['ORIGINAL_IGNORED_LINES']:
-                m.update(s.encode('utf-8'))
+            ignored_hash = ignored_lines_hash(
+                tuple(config['ORIGINAL_IGNORED_LINES']))
             
             # 确定配置参数
-            CALCULATE_HIGH_SPEED = not data.get('disable_high_speed', False)
-            CALCULATE_WALKING_WILD = data.get('enable_wild', False)
+            CALCULATE_HIGH_SPEED = not disable_high_speed
+            CALCULATE_WALKING_WILD = enable_wild
             __version__ = '130'  # 与 mtr_pathfinder.py 中的版本号保持一致
             
             # 生成缓存文件名
             filename = f'mtr_pathfinder_temp{os.sep}' + \
                 f'3{int(CALCULATE_HIGH_SPEED)}{int(CALCULATE_WALKING_WILD)}' + \
-                f'-{version1}-{version2}-{m.hexdigest()}-{__version__}.dat'
+                f'-{version1}-{version2}-{ignored_hash}-{__version__}.dat'
             
             # 在调用寻路函数之前，检查缓存文件是否已经存在
             cache_file_existed_before = os.path.exists(filename)
@@ -1066,33 +1337,34 @@ def api_find_route():
             })
 
             # 调用mtr_pathfinder.py的main函数，gen_image=False
-            result_gen_image_false = mtr_main_v3(
-                station1=data['start'],
-                station2=data['end'],
-                LINK=LINK,
-                LOCAL_FILE_PATH=LOCAL_FILE_PATH,
-                INTERVAL_PATH=INTERVAL_PATH,
-                BASE_PATH=BASE_PATH,
-                PNG_PATH=PNG_PATH,
-                MAX_WILD_BLOCKS=config['MAX_WILD_BLOCKS'],
-                TRANSFER_ADDITION=config['TRANSFER_ADDITION'],
-                WILD_ADDITION=config['WILD_ADDITION'],
-                STATION_TABLE=config['STATION_TABLE'],
-                ORIGINAL_IGNORED_LINES=config['ORIGINAL_IGNORED_LINES'],
-                UPDATE_DATA=False,
-                GEN_ROUTE_INTERVAL=False,
-                IGNORED_LINES=data.get('ignored_lines', []),
-                ONLY_LINES=data.get('only_lines', []),
-                AVOID_STATIONS=data.get('avoid_stations', []),
-                CALCULATE_HIGH_SPEED=not data.get('disable_high_speed', False),
-                CALCULATE_BOAT=not data.get('disable_boat', False),
-                CALCULATE_WALKING_WILD=data.get('enable_wild', False),
-                ONLY_LRT=data.get('only_lrt', False),
-                IN_THEORY=IN_THEORY,
-                DETAIL=DETAIL,
-                MTR_VER=MTR_VER,
-                gen_image=False
-            )
+            with v3_pathfinding_lock:
+                result_gen_image_false = mtr_main_v3(
+                    station1=start,
+                    station2=end,
+                    LINK=LINK,
+                    LOCAL_FILE_PATH=LOCAL_FILE_PATH,
+                    INTERVAL_PATH=INTERVAL_PATH,
+                    BASE_PATH=BASE_PATH,
+                    PNG_PATH=PNG_PATH,
+                    MAX_WILD_BLOCKS=config['MAX_WILD_BLOCKS'],
+                    TRANSFER_ADDITION=config['TRANSFER_ADDITION'],
+                    WILD_ADDITION=config['WILD_ADDITION'],
+                    STATION_TABLE=config['STATION_TABLE'],
+                    ORIGINAL_IGNORED_LINES=config['ORIGINAL_IGNORED_LINES'],
+                    UPDATE_DATA=False,
+                    GEN_ROUTE_INTERVAL=False,
+                    IGNORED_LINES=ignored_lines,
+                    ONLY_LINES=only_lines,
+                    AVOID_STATIONS=avoid_stations,
+                    CALCULATE_HIGH_SPEED=not disable_high_speed,
+                    CALCULATE_BOAT=not disable_boat,
+                    CALCULATE_WALKING_WILD=enable_wild,
+                    ONLY_LRT=only_lrt,
+                    IN_THEORY=IN_THEORY,
+                    DETAIL=DETAIL,
+                    MTR_VER=MTR_VER,
+                    gen_image=False
+                )
             
             search_progress.update({
                 'percentage': 30,
@@ -1101,11 +1373,10 @@ def api_find_route():
             })
 
             # 检查寻路结果
-            if result_gen_image_false in [False, None]:
-                if result_gen_image_false is False:
-                    return jsonify({'error': '找不到路线，请尝试调整选项'}), 400
-                else:
-                    return jsonify({'error': '车站名称不正确，请检查输入'}), 400
+            if result_gen_image_false is False:
+                return jsonify({'error': '找不到路线，请尝试调整选项'}), 400
+            elif result_gen_image_false is None:
+                return jsonify({'error': '车站名称不正确，请检查输入'}), 400
             
             search_progress.update({
                 'percentage': 35,
@@ -1123,11 +1394,10 @@ def api_find_route():
             })
 
             # 检查寻路结果是否有效
-            if ert in [False, None]:
-                if ert is False:
-                    return jsonify({'error': '找不到路线，请尝试调整选项'}), 400
-                else:
-                    return jsonify({'error': '车站名称不正确，请检查输入'}), 400
+            if ert is False:
+                return jsonify({'error': '找不到路线，请尝试调整选项'}), 400
+            elif ert is None:
+                return jsonify({'error': '车站名称不正确，请检查输入'}), 400
             
             search_progress.update({
                 'percentage': 55,
@@ -1143,7 +1413,7 @@ def api_find_route():
             
             # 检查是否使用了缓存
             # 只检查用户是否额外添加了禁路线，不考虑全局禁路线
-            user_ignored_lines = data.get('ignored_lines', [])
+            user_ignored_lines = ignored_lines
             global_ignored_lines = config['ORIGINAL_IGNORED_LINES']
             
             # 计算用户真正额外添加的禁路线：用户传入的禁路线减去全局禁路线
@@ -1151,10 +1421,10 @@ def api_find_route():
             
             # 只有当用户没有额外添加禁路线时，才满足缓存条件
             ignored_lines_ok = len(extra_ignored_lines) == 0
-            disable_boat_ok = not data.get('disable_boat', False)
-            only_lrt_ok = not data.get('only_lrt', False)
-            only_lines_ok = len(data.get('only_lines', [])) == 0
-            avoid_stations_ok = len(data.get('avoid_stations', [])) == 0
+            disable_boat_ok = not disable_boat
+            only_lrt_ok = not only_lrt
+            only_lines_ok = len(only_lines) == 0
+            avoid_stations_ok = len(avoid_stations) == 0
             route_type_ok = route_type == RouteTypeV3.WAITING
             
             cache_conditions_met = (ignored_lines_ok and \
@@ -1287,7 +1557,6 @@ def api_find_route():
 
             # 3. 将寻路结果和生成图片所需数据存储在缓存中，供后续图片生成使用
             # 生成唯一标识符
-            import uuid
             image_id = str(uuid.uuid4())
             
             # 存储寻路结果和生成图片所需数据
@@ -1316,60 +1585,20 @@ def api_find_route():
             'message': '路径计算完成'
         })
         
-        # 计算寻路用时
-        end_time = datetime.now()
-        calc_time = (end_time - start_time).total_seconds()
-        
-        # 获取数据版本信息
-        station_version = ""
-        station_version_v4 = ""
-        route_version_v4 = ""
-        interval_version = ""
-        
-        if os.path.exists(config['LOCAL_FILE_PATH_V3']):
-            station_version = datetime.fromtimestamp(
-                os.path.getmtime(config['LOCAL_FILE_PATH_V3'])
-            ).strftime('%Y%m%d-%H%M')
-        if os.path.exists(config['LOCAL_FILE_PATH_V4']):
-            station_version_v4 = datetime.fromtimestamp(
-                os.path.getmtime(config['LOCAL_FILE_PATH_V4'])
-            ).strftime('%Y%m%d-%H%M')
-        if os.path.exists(config['DEP_PATH_V4']):
-            route_version_v4 = datetime.fromtimestamp(
-                os.path.getmtime(config['DEP_PATH_V4'])
-            ).strftime('%Y%m%d-%H%M')
-        if os.path.exists(config['INTERVAL_PATH_V3']):
-            interval_version = datetime.fromtimestamp(
-                os.path.getmtime(config['INTERVAL_PATH_V3'])
-            ).strftime('%Y%m%d-%H%M')
-        
         # 图片将由/api/generate_image路由生成，这里只需要将状态设置为ready
         image_cache[image_id]['status'] = 'ready'
         
-        # 构建响应数据
-        response_data = {
-            'result': formatted_result, 
-            'algorithm': algorithm,
-            'calc_time': calc_time,
-            'used_cache': used_cache if algorithm != 'real' else False,  # 只有实时寻路模式下重置为False
-            'data_versions': {
-                'station_version': station_version,
-                'station_version_v4': station_version_v4,
-                'route_version_v4': route_version_v4,
-                'interval_version': interval_version
-            },
-            'image_id': image_id  # 返回图片的唯一标识符
-        }
-        
-        # 仅实时模式返回实际使用的出发时间
-        if algorithm == 'real' and actual_departure_time is not None:
-            response_data['departure_time'] = actual_departure_time
+        # 缓存寻路结果，相同的请求不再重新寻路
+        if result_key is not None:
+            put_route_result(result_key, {
+                'result': formatted_result,
+                'image_data': image_cache[image_id]['data'],
+                'departure_time': actual_departure_time
+            })
         
-        # 返回调整后的结果，包含寻路模式、计算用时、数据版本和缓存标志
-        return jsonify(response_data)
+        return route_result_response(algorithm, formatted_result, start_time,
+                                     used_cache, image_id, actual_departure_time)
     except Exception as e:
-        import traceback
-        import logging
         logging.basicConfig(level=logging.ERROR)
         logger = logging.getLogger(__name__)
         
@@ -1385,6 +1614,33 @@ def api_find_route():
         
         return jsonify({'error': str(e), 'detail': error_detail}), 500
 
+# 构建寻路响应：包含寻路结果、寻路模式、计算用时、数据版本和缓存标志
+def route_result_response(algorithm, formatted_result, start_time, used_cache,
+                          image_id, actual_departure_time):
+    # 计算寻路用时
+    end_time = datetime.now()
+    calc_time = (end_time - start_time).total_seconds()
+    
+    # 获取数据版本信息
+    data_versions = get_data_versions()
+    
+    # 构建响应数据
+    response_data = {
+        'result': formatted_result, 
+        'algorithm': algorithm,
+        'calc_time': calc_time,
+        'used_cache': used_cache if algorithm != 'real' else False,  # 只有实时寻路模式下重置为False
+        'data_versions': data_versions,
+        'image_id': image_id  # 返回图片的唯一标识符
+    }
+    
+    # 仅实时模式返回实际使用的出发时间
+    if algorithm == 'real' and actual_departure_time is not None:
+        response_data['departure_time'] = actual_departure_time
+    
+    # 返回调整后的结果，包含寻路模式、计算用时、数据版本和缓存标志
+    return jsonify(response_data)
+
 @app.route('/api/progress', methods=['GET'])
 def api_progress():
     """返回当前寻路进度"""
@@ -1406,32 +1662,29 @@ def api_search_stations():
     query = request.args.get('q', '').lower()
     
     # 优先使用v3版本的数据文件，因为它包含更多信息
+    # 使用按数据文件缓存的搜索索引，文件修改后自动重建
     data_file_path = config['LOCAL_FILE_PATH_V3']
-    if not os.path.exists(data_file_path):
+    mtime_ns = file_mtime_ns(data_file_path)
+    if mtime_ns is None:
         return jsonify([])
     
-    with open(data_file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # 空查询匹配所有车站，直接返回预先序列化好的前10个
+    if not query:
+        return conditional_data(app.response_class(
+            _station_search_default(data_file_path, mtime_ns),
+            mimetype='application/json'), mtime_ns)
     
-    stations = []
-    # 统一处理，无论MTR_VER版本，数据都是列表格式
-    if isinstance(data, list) and len(data) > 0:
-        stations = data[0]['stations'].values()
-    elif isinstance(data, dict):
-        # 兼容旧格式，直接访问
-        stations = data['stations'].values()
-    else:
-        # 无效格式，返回空列表
-        return jsonify([])
+    index = _station_search_index(data_file_path, mtime_ns)
     
     results = []
-    for station in stations:
-        if query in station['name'].lower():
-            # 将车站名称中的竖线替换为空格
-            formatted_name = station['name'].replace('|', ' ')
-            results.append(formatted_name)
-    
-    return jsonify(results[:10])  # 限制返回10个结果
+    for display_name, lower_name in index:
+        if query in lower_name:
+            results.append(display_name)
+            # 限制返回10个结果，找够后不再继续扫描
+            if len(results) == 10:
+                break
+    
+    return conditional_data(jsonify(results), mtime_ns)
 
 # 全局变量，用于存储最新生成的图片文件路径
 latest_image_path = ''
@@ -1464,13 +1717,11 @@ def api_generate_image():
             return jsonify({'status': image_info['status'], 'image_id': image_id})
         
         # 确保输出目录存在
-        import os
         output_dir = 'generated_images'
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
         # 生成唯一的图片文件名
-        from datetime import datetime
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         image_path = os.path.join(output_dir, f'path_result_{timestamp}.png')
         
@@ -1484,7 +1735,6 @@ def api_generate_image():
         
         if algorithm == 'real':
             # 使用v4版程序生成图片
-            from mtr_pathfinder_lib.mtr_pathfinder_v4 import RouteType as RouteTypeV4
             image_result = save_image_v4(
                 route_type=RouteTypeV4.REAL_TIME,
                 every_route_time=image_data['every_route_time'],
@@ -1538,7 +1788,6 @@ def api_generate_image():
             image_cache[image_id]['error'] = '图片生成失败'
             return jsonify({'status': 'failed', 'error': '图片生成失败', 'image_id': image_id}), 500
     except Exception as e:
-        import traceback
         print(f"生成图片错误: {traceback.format_exc()}")
         # 更新缓存中的图片信息
         if image_id in image_cache:
@@ -1550,9 +1799,6 @@ def api_generate_image():
 def api_get_image():
     """获取生成的结果图片"""
     try:
-        import os
-        from flask import Response
-        
         # 获取image_id参数
         image_id = request.args.get('image_id')
         
@@ -1567,11 +1813,15 @@ def api_get_image():
                 # 如果图片生成失败，返回错误信息
                 return jsonify({'status': 'failed', 'error': image_info.get('error', '图片生成失败')}), 500
             elif image_info['image_base64']:
+                # 图片已保存到磁盘时直接发送文件（支持ETag/304条件请求），无需每次解码base64
+                image_path = image_info.get('image_path')
+                if image_path and os.path.exists(image_path):
+                    return send_file(os.path.abspath(image_path), mimetype='image/png', conditional=True)
+                
                 # 如果图片生成成功，返回图片数据
                 image_base64 = image_info['image_base64']
                 
                 # 解析base64数据
-                import base64
                 if image_base64.startswith('data:image/png;base64,'):
                     image_base64 = image_base64.split(',')[1]
                 
@@ -1588,7 +1838,6 @@ def api_get_image():
             if not os.path.exists(output_dir):
                 return jsonify({'error': '没有找到图片文件'}), 404
             
-            import glob
             png_files = glob.glob(os.path.join(output_dir, '*.png'))
             if not png_files:
                 return jsonify({'error': '没有找到图片文件'}), 404
@@ -1600,7 +1849,6 @@ def api_get_image():
         # 返回最新生成的图片文件
         return send_from_directory(os.path.dirname(latest_image_path), os.path.basename(latest_image_path))
     except Exception as e:
-        import traceback
         print(f"获取图片错误: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
@@ -1608,9 +1856,6 @@ def api_get_image():
 def api_clear_cache():
     """清除寻路缓存"""
     try:
-        import os
-        import shutil
-        
         # 清除mtr_pathfinder_temp文件夹中的所有内容
         temp_dir = 'mtr_pathfinder_temp'
         deleted_files = []
@@ -1629,7 +1874,6 @@ def api_clear_cache():
         
         return jsonify({'success': True, 'deleted_files': deleted_files})
     except Exception as e:
-        import traceback
         print(f"清除寻路缓存错误: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
@@ -1637,9 +1881,6 @@ def api_clear_cache():
 def api_clear_images():
     """清除寻路结果图片"""
     try:
-        import os
-        import glob
-        
         # 清除generated_images目录下的所有PNG文件
         output_dir = 'generated_images'
         if os.path.exists(output_dir):
@@ -1654,7 +1895,6 @@ def api_clear_images():
         
         return jsonify({'success': True})
     except Exception as e:
-        import traceback
         print(f"清除结果图片错误: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
@@ -1666,11 +1906,14 @@ def api_update_config():
     
     if 'link' in data:
         config['LINK'] = data['link']
-        update_file_paths()
     
     if 'mtr_ver' in data:
         config['MTR_VER'] = int(data['mtr_ver'])
     
+    # 数据文件路径取决于链接和MTR版本，两者都设置后再更新（随后统一保存配置）
+    if 'link' in data or 'mtr_ver' in data:
+        update_file_paths()
+    
     if 'max_wild_blocks' in data:
         config['MAX_WILD_BLOCKS'] = int(data['max_wild_blocks'])
     
@@ -1696,51 +1939,49 @@ def api_update_config():
         config['UMAMI_WEBSITE_ID'] = data['umami_website_id']
 
     save_config(config)
+    # 页面模板中使用了配置项，清除已缓存的页面
+    _render_index.cache_clear()
+    _render_stations.cache_clear()
+    _render_routes.cache_clear()
+    _render_station_detail.cache_clear()
+    _render_route_detail.cache_clear()
+    # 寻路结果取决于配置，清空已缓存的结果
+    clear_route_results()
     return jsonify({'success': True})
 
 def _update_data():
     """内部函数：执行数据更新逻辑，被api_update_data和check_and_update_data调用"""
-    import sys
-    from io import StringIO
-    
     # 保存原始stdin
     original_stdin = sys.stdin
-    # 创建模拟输入流，自动返回'y'
-    mock_stdin = StringIO('y\n' * 20)  # 提供足够的'y'响应
-    sys.stdin = mock_stdin
+    # 创建模拟输入流，自动返回'y'（输入流读取后即消耗，每次更新需新建）
+    sys.stdin = StringIO(AUTO_CONFIRM_INPUT)
     
     try:
-        # 1. 生成v3版程序所需的数据
-        print("正在生成V3版车站数据...")
-        fetch_data_v3(
-            config['LINK'],
-            config['LOCAL_FILE_PATH_V3'],
-            config['MTR_VER']
-        )
-        
-        print("正在生成V3版间隔数据...")
-        gen_route_interval_v3(
-            config['LOCAL_FILE_PATH_V3'],
-            config['INTERVAL_PATH_V3'],
-            config['LINK'],
-            config['MTR_VER']
-        )
-        
-        # 2. 生成v4版程序所需的数据
-        print("正在生成V4版车站数据...")
-        from mtr_pathfinder_lib.mtr_pathfinder_v4 import fetch_data as fetch_data_v4
-        fetch_data_v4(
-            config['LINK'],
-            config['LOCAL_FILE_PATH_V4'],
-            config['MAX_WILD_BLOCKS']
-        )
-        
-        print("正在生成V4版发车数据...")
-        gen_departure_v4(
-            config['LINK'],
-            config['DEP_PATH_V4']
-        )
+        # v3间隔数据需读取v3车站数据，两者按顺序生成；
+        # v4车站数据和v4发车数据互不依赖，三组任务并行下载
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [
+                executor.submit(_update_data_v3),
+                executor.submit(_update_stations_v4),
+                executor.submit(_update_departures_v4)
+            ]
+            # 等待全部任务完成，任一任务失败时抛出其异常
+            for future in futures:
+                future.result()
         
+        # 写入数据快照，下次启动时无需重新解析JSON
+        for path in (config['LOCAL_FILE_PATH_V3'],
+                     config['INTERVAL_PATH_V3']):
+            write_snapshot(path)
+
+        # 数据已更新，清除已缓存的页面并预先生成新的视图数据
+        _render_stations.cache_clear()
+        _render_routes.cache_clear()
+        _render_station_detail.cache_clear()
+        _render_route_detail.cache_clear()
+        clear_route_results()
+        _data_versions.cache_clear()
+        warm_list_views()
         print("数据更新完成！")
         return True
     except Exception as e:
@@ -1750,23 +1991,63 @@ def _update_data():
         # 恢复原始stdin
         sys.stdin = original_stdin
 
+# 1. 生成v3版程序所需的数据
+def _update_data_v3():
+    print("正在生成V3版车站数据...")
+    fetch_data_v3(
+        config['LINK'],
+        config['LOCAL_FILE_PATH_V3'],
+        config['MTR_VER']
+    )
+    
+    print("正在生成V3版间隔数据...")
+    gen_route_interval_v3(
+        config['LOCAL_FILE_PATH_V3'],
+        config['INTERVAL_PATH_V3'],
+        config['LINK'],
+        config['MTR_VER']
+    )
+
+# 2. 生成v4版程序所需的数据
+def _update_stations_v4():
+    print("正在生成V4版车站数据...")
+    fetch_data_v4(
+        config['LINK'],
+        config['LOCAL_FILE_PATH_V4'],
+        config['MAX_WILD_BLOCKS']
+    )
+
+def _update_departures_v4():
+    print("正在生成V4版发车数据...")
+    gen_departure_v4(
+        config['LINK'],
+        config['DEP_PATH_V4']
+    )
+
+# 提交数据更新任务并等待结果，已有更新在运行时直接等待该任务，不重复下载数据
+def run_data_update():
+    global update_future, data_update_progress
+    with update_lock:
+        if update_future is None or update_future.done():
+            # 重置数据更新进度
+            data_update_progress = {
+                'percentage': 0,
+                'stage': '准备中...',
+                'message': '正在准备数据更新...'
+            }
+            update_future = update_executor.submit(_update_data)
+        future = update_future
+    return future.result()
+
 @app.route('/api/update_data', methods=['POST'])
 def api_update_data():
     # 更新数据
     if not config['LINK']:
         return jsonify({'error': '未设置地图链接'}), 400
     
-    # 重置数据更新进度
-    global data_update_progress
-    data_update_progress = {
-        'percentage': 0,
-        'stage': '准备中...',
-        'message': '正在准备数据更新...'
-    }
-    
     try:
         # 调用内部数据更新函数
-        success = _update_data()
+        success = run_data_update()
         
         if success:
             # 数据更新完成
@@ -1805,8 +2086,6 @@ def check_and_update_data():
     # 设置标志位为True，确保只运行一次
     data_checked = True
     
-    import os
-    
     print("检查数据文件是否存在...")
     
     # 检查必要的数据文件是否存在
@@ -1822,12 +2101,14 @@ def check_and_update_data():
     
     if files_exist:
         print("所有数据文件已存在，无需更新")
+        # 在后台预先解析数据并生成视图，首次搜索和打开列表页面时无需等待
+        update_executor.submit(warm_list_views)
         return
     
     print("检测到缺失的数据文件，正在自动更新...")
     
     # 调用内部数据更新函数
-    _update_data()
+    run_data_update()
 
 
 if __name__ == '__main__':
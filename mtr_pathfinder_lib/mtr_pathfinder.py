@@ -2,12 +2,13 @@
 Find paths between two stations for Minecraft Transit Railway.
 '''
 
+from bisect import bisect_left
 from difflib import SequenceMatcher
 from enum import Enum
+from functools import lru_cache
 from io import BytesIO
-from itertools import chain
+from itertools import chain, combinations
 from math import gcd, sqrt
-from operator import itemgetter
 from statistics import median_low
 from threading import Thread, BoundedSemaphore
 from time import gmtime, strftime, time
@@ -16,6 +17,7 @@ from queue import Queue
 import base64
 import hashlib
 import json
+import mmap
 import os
 import pickle
 import re
@@ -26,6 +28,11 @@ from PIL import Image, ImageDraw, ImageFont
 import networkx as nx
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 __version__ = '130'
 SERVER_TICK: int = 20
 
@@ -42,11 +49,14 @@ DEFAULT_AVERAGE_SPEED: dict = {
 RUNNING_SPEED: int = 5.612          # 站内换乘速度，单位 block/s
 TRANSFER_SPEED: int = 4.317         # 出站换乘速度，单位 block/s
 WILD_WALKING_SPEED: int = 2.25      # 非出站换乘（越野）速度，单位 block/s
+DIGITS_RE = re.compile(r'(\d+)')    # 自然排序用的数字分段正则
 
 ROUTE_INTERVAL_DATA = Queue()
 semaphore = BoundedSemaphore(25)
 original = {}
 tmp_names = {}
+GRAPH_CACHE_SIZE: int = 8           # 内存中缓存的图的数量
+graph_cache = {}                    # 选项 -> (图, original, intervals)
 opencc1 = OpenCC('s2t')
 opencc2 = OpenCC('t2jp')
 opencc3 = OpenCC('t2s')
@@ -228,11 +238,43 @@ def atoi(text: str) -> Union[str, int]:
     return int(text) if text.isdigit() else text
 
 
-def natural_keys(text: str) -> list:
+@lru_cache(maxsize=4096)
+def natural_keys(text: str) -> tuple:
+    '''
+    A sorting key in number order (memoized, returned as a tuple).
+    '''
+    return tuple(atoi(c) for c in DIGITS_RE.split(text))
+
+
+def format_time(seconds: float) -> str:
     '''
-    A sorting key in number order.
+    Format seconds as HH:MM:SS, or MM:SS when less than an hour.
     '''
-    return [atoi(c) for c in re.split(r'(\d+)', text)]
+    if seconds is None:
+        return '--:--'
+
+    h, rem = divmod(int(seconds // 1) % 86400, 3600)
+    m, s = divmod(rem, 60)
+    if h == 0:
+        return f'{m:02d}:{s:02d}'
+
+    return f'{h:02d}:{m:02d}:{s:02d}'
+
+
+def load_json(path: str):
+    '''
+    Load a JSON data file, using orjson if it is installed.
+    With orjson the file is memory-mapped and parsed in place,
+    without reading a separate copy of its bytes.
+    '''
+    if orjson is None:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+            return orjson.loads(view)
 
 
 def lcm(a: int, b: int) -> int:
@@ -261,8 +303,7 @@ def gen_route_interval(LOCAL_FILE_PATH, INTERVAL_PATH, LINK, MTR_VER) -> None:
     '''
     Generate all the interval data.
     '''
-    with open(LOCAL_FILE_PATH, encoding='utf-8') as f:
-        data = json.load(f)
+    data = load_json(LOCAL_FILE_PATH)
 
     if MTR_VER == 3:
         threads: list[Thread] = []
@@ -367,7 +408,7 @@ def gen_route_interval(LOCAL_FILE_PATH, INTERVAL_PATH, LINK, MTR_VER) -> None:
     y = input(f'是否替换{INTERVAL_PATH}文件? (Y/N) ').lower()
     if y == 'y':
         with open(INTERVAL_PATH, 'w', encoding='utf-8') as f:
-            json.dump(freq_dict, f)
+            json.dump(freq_dict, f, separators=(',', ':'))
 
 
 def fetch_data(link: str, LOCAL_FILE_PATH, MTR_VER) -> str:
@@ -428,7 +469,7 @@ def fetch_data(link: str, LOCAL_FILE_PATH, MTR_VER) -> str:
     y = input(f'是否替换{LOCAL_FILE_PATH}文件? (Y/N) ').lower()
     if y == 'y':
         with open(LOCAL_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f)
+            json.dump(data, f, separators=(',', ':'))
 
     return data
 
@@ -643,30 +684,49 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
     Create the graph of all routes.
     '''
     global original, intervals
-    with open(INTERVAL_PATH, 'r', encoding='utf-8') as f:
-        intervals = json.load(f)
-
-    if not os.path.exists('mtr_pathfinder_temp'):
-        os.makedirs('mtr_pathfinder_temp')
+    # 内存中的图缓存：数据文件与所有选项都相同时直接复用，
+    # 同时恢复寻路结果处理所需的original和intervals
+    memory_key = None
+    if cache is True:
+        options = (IGNORED_LINES, ONLY_LINES, CALCULATE_HIGH_SPEED,
+                   CALCULATE_BOAT, CALCULATE_WALKING_WILD, ONLY_LRT,
+                   AVOID_STATIONS, route_type, original_ignored_lines,
+                   STATION_TABLE, WILD_ADDITION, TRANSFER_ADDITION,
+                   MAX_WILD_BLOCKS, MTR_VER)
+        memory_key = graph_memory_key(LOCAL_FILE_PATH, INTERVAL_PATH, options)
+        if memory_key is not None:
+            cached = graph_cache.pop(memory_key, None)
+            if cached is not None:
+                # 重新插入，使字典顺序即为最近使用顺序
+                graph_cache[memory_key] = cached
+                G, original, intervals = cached
+                return G
+
+    intervals = load_json(INTERVAL_PATH)
+
+    os.makedirs('mtr_pathfinder_temp', exist_ok=True)
 
     filename = ''
-    m = hashlib.md5()
     if cache is True and IGNORED_LINES == original_ignored_lines and \
             CALCULATE_BOAT is True and ONLY_LRT is False and \
             ONLY_LINES == [] and AVOID_STATIONS == [] and \
             route_type == RouteType.WAITING:
-        for s in original_ignored_lines:
-            m.update(s.encode('utf-8'))
+        # 逐项update与对拼接结果做一次摘要等价，文件名保持不变
+        ignored_hash = hashlib.md5(
+            ''.join(original_ignored_lines).encode('utf-8')).hexdigest()
 
         filename = f'mtr_pathfinder_temp{os.sep}' + \
             f'3{int(CALCULATE_HIGH_SPEED)}{int(CALCULATE_WALKING_WILD)}' + \
-            f'-{version1}-{version2}-{m.hexdigest()}-{__version__}.dat'
-        if os.path.exists(filename):
+            f'-{version1}-{version2}-{ignored_hash}-{__version__}.dat'
+        try:
             with open(filename, 'rb') as f:
                 tup = pickle.load(f)
-                G = tup[0]
-                original = tup[1]
-
+        except FileNotFoundError:
+            pass
+        else:
+            G = tup[0]
+            original = tup[1]
+            remember_graph(memory_key, G)
             return G
 
     routes = data[0]['routes']
@@ -712,7 +772,13 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
             data[0]['routes'][route_id] = old_route_data
 
         with open(LOCAL_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f)
+            json.dump(data, f, separators=(',', ':'))
+
+        # 数据文件已被改写，修改时间变化，按新的修改时间记住图，
+        # 否则之后的请求无法命中这次建好的图
+        if memory_key is not None:
+            memory_key = graph_memory_key(LOCAL_FILE_PATH, INTERVAL_PATH,
+                                          options)
 
     avoid_ids = [station_name_to_id(data, x, STATION_TABLE)
                  for x in AVOID_STATIONS]
@@ -843,83 +909,85 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
         if len(stations) - 1 > len(durations):
             continue
 
-        # if route_type == RouteType.WAITING:
-        for i in range(len(durations)):
-            for i2 in range(len(durations[i:])):
-                i2 += i + 1
-                if MTR_VER == 3:
-                    platform = None
-                    station_1 = stations[i].split('_')[0]
-                    station_2 = stations[i2].split('_')[0]
-                    dur_list = durations[i:i2]
-                    station_list = stations[i:i2 + 1]
-                    c = False
-                    for sta in station_list:
-                        if sta.split('_')[0] in avoid_ids:
-                            c = True
-                    if c is True:
-                        continue
+        if MTR_VER == 3:
+            station_ids = [x.split('_')[0] for x in stations]
+        else:
+            station_ids = [x['id'] for x in stations]
+            # 停站时间前缀和 (毫秒)，区间内停站时间 O(1) 得出
+            dwell_cum = [0]
+            for x in stations:
+                dwell_cum.append(dwell_cum[-1] + x['dwellTime'])
+
+        # 运行时间前缀和，以及运行时间为 0 的区间个数前缀和
+        dur_cum = [0]
+        zero_cum = [0]
+        for x in durations:
+            dur_cum.append(dur_cum[-1] + x)
+            zero_cum.append(zero_cum[-1] + (x == 0))
+
+        # 避开车站在本线路中的位置 (升序)，区间 [i, i2] 内有则跳过
+        avoided = [k for k, sta in enumerate(station_ids) if sta in avoid_ids]
 
-                    if 0 in dur_list:
-                        t = get_approximated_time(route, station_1, station_2,
-                                                  data, MTR_VER)
-                        if t is None:
-                            continue
-                        dur = t
-                    else:
-                        dur = sum(durations[i:i2]) / SERVER_TICK
+        # if route_type == RouteType.WAITING:
+        for i, i2 in combinations(range(len(stations)), 2):
+            if avoided and \
+                    bisect_left(avoided, i2 + 1) > bisect_left(avoided, i):
+                continue
 
-                else:
-                    station_1 = stations[i]
-                    station_2 = stations[i2]
-                    dur_list = durations[i:i2]
-                    station_list = stations[i:i2 + 1]
-                    dwell = sum([x['dwellTime'] / 1000
-                                 for x in station_list][1:-1])
-                    # if route_type == RouteType.IN_THEORY:
-                    #     dwell += (station_1['dwellTime'] +
-                    #               station_2['dwellTime']) / 2 / 1000
-                    c = False
-                    for sta in station_list:
-                        if sta['id'] in avoid_ids:
-                            c = True
-                    if c is True:
+            if MTR_VER == 3:
+                platform = None
+                station_1 = station_ids[i]
+                station_2 = station_ids[i2]
+                if zero_cum[i2] > zero_cum[i]:
+                    t = get_approximated_time(route, station_1, station_2,
+                                              data, MTR_VER)
+                    if t is None:
                         continue
+                    dur = t
+                else:
+                    dur = (dur_cum[i2] - dur_cum[i]) / SERVER_TICK
 
-                    if 0 in dur_list:
-                        t = get_app_time_v4(route, station_1, station_2,
-                                            data, MTR_VER)
-                        if t is None:
-                            continue
-                        dur = round(t + dwell)
-                    else:
-                        dur = round(sum(durations[i:i2]) + dwell)
+            else:
+                station_1 = stations[i]
+                station_2 = stations[i2]
+                dwell = (dwell_cum[i2] - dwell_cum[i + 1]) / 1000
+                # if route_type == RouteType.IN_THEORY:
+                #     dwell += (station_1['dwellTime'] +
+                #               station_2['dwellTime']) / 2 / 1000
+                if zero_cum[i2] > zero_cum[i]:
+                    t = get_app_time_v4(route, station_1, station_2,
+                                        data, MTR_VER)
+                    if t is None:
+                        continue
+                    dur = round(t + dwell)
+                else:
+                    dur = round(dur_cum[i2] - dur_cum[i] + dwell)
 
-                    platform = station_1['name']
-                    station_1 = station_1['id']
-                    station_2 = station_2['id']
+                platform = station_1['name']
+                station_1 = station_1['id']
+                station_2 = station_2['id']
 
-                if route_type == RouteType.WAITING:
-                    wait = float(intervals[n])
-                    if (station_1, station_2) not in edges_dict:
-                        edges_dict[(station_1, station_2)] = []
+            if route_type == RouteType.WAITING:
+                wait = float(intervals[n])
+                if (station_1, station_2) not in edges_dict:
+                    edges_dict[(station_1, station_2)] = []
 
-                    edges_dict[(station_1, station_2)].append(
-                        (dur, wait, route['name'], platform))
+                edges_dict[(station_1, station_2)].append(
+                    (dur, wait, route['name'], platform))
 
-                    original_tuple = (route['name'], station_1, station_2)
-                    if original_tuple in original:
-                        dur1 = original[original_tuple]
-                        if dur < dur1:
-                            original[original_tuple] = dur
-                    else:
+                original_tuple = (route['name'], station_1, station_2)
+                if original_tuple in original:
+                    dur1 = original[original_tuple]
+                    if dur < dur1:
                         original[original_tuple] = dur
                 else:
-                    if (station_1, station_2) not in edges_attr_dict:
-                        edges_attr_dict[(station_1, station_2)] = []
+                    original[original_tuple] = dur
+            else:
+                if (station_1, station_2) not in edges_attr_dict:
+                    edges_attr_dict[(station_1, station_2)] = []
 
-                    edges_attr_dict[(station_1, station_2)].append(
-                        ((route['name'], platform), dur, 0))
+                edges_attr_dict[(station_1, station_2)].append(
+                    ((route['name'], platform), dur, 0))
 
         # else:
             # for i, duration in enumerate(durations):
@@ -991,10 +1059,20 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
 
             edges_attr_dict[(s1, s2)] = [(final_routes, min_dur, sum_int)]
 
-    for edge in edges_attr_dict.items():
-        u, v = edge[0]
-        min_time = min(e[1] + e[2] for e in edge[1])
-        for r in edge[1]:
+    for (u, v), edge_attrs in edges_attr_dict.items():
+        # 一次遍历求最短用时，只为不超过最短用时 60 秒的线路建边
+        min_time = float('inf')
+        weighted = []
+        for r in edge_attrs:
+            weight = r[1] + r[2]
+            if weight < min_time:
+                min_time = weight
+            weighted.append((weight, r))
+
+        for weight, r in weighted:
+            if weight - min_time > 60 or weight <= 0:
+                continue
+
             if isinstance(r[0], str):
                 route_name = r[0]
                 platform = None
@@ -1006,16 +1084,13 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
                     route_name = [x[0] for x in r[0]]
                     platform = [x[1] for x in r[0]]
 
-            duration = r[1]
-            waiting_time = r[2]
-            weight = duration + waiting_time
-            if abs(weight - min_time) <= 60 and weight > 0:
-                G.add_edge(u, v, weight=weight, name=route_name,
-                           waiting=waiting_time, platform=platform)
+            G.add_edge(u, v, weight=weight, name=route_name,
+                       waiting=r[2], platform=platform)
 
     # 添加野外行走 (无铁路连接)
     if CALCULATE_WALKING_WILD is True:
         edges_attr_dict = {}
+        adj = G.adj
         for station, station_dict in all_stations.items():
             if station in avoid_ids:
                 continue
@@ -1023,6 +1098,7 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
             if 'x' not in station_dict or 'z' not in station_dict:
                 continue
 
+            neighbours = adj.get(station, {})
             for station2, station2_dict in all_stations.items():
                 if station2 in avoid_ids:
                     continue
@@ -1040,15 +1116,16 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
                 if dist <= (MAX_WILD_BLOCKS ** 2):
                     dist = sqrt(dist)
                     duration = dist / WILD_WALKING_SPEED
-                    if G.has_edge(station, station2) and \
-                            duration - G[station][station2][0]['weight'] > 60:
-                        continue
+                    existing = neighbours.get(station2)
+                    if existing is not None:
+                        existing_weight = existing[0]['weight']
+                        if duration - existing_weight > 60:
+                            continue
 
                     edges_attr_dict[(station, station2)] = [
                         (f'步行 Walk {round(dist, 2)}m', duration, 0)]
-                    if G.has_edge(station, station2) and \
-                            duration + 120 < \
-                            G[station][station2][0]['weight']:
+                    if existing is not None and \
+                            duration + 120 < existing_weight:
                         G.remove_edge(station, station2)
 
         for edge in edges_attr_dict.items():
@@ -1061,13 +1138,74 @@ def create_graph(data: list, IGNORED_LINES: list[str], ONLY_LINES: list[str],
                            waiting=waiting_time)
 
     if filename != '':
-        if not os.path.exists(filename):
-            with open(filename, 'wb') as f:
+        try:
+            with open(filename, 'xb') as f:
                 pickle.dump((G, original), f)
+        except FileExistsError:
+            pass
 
+    remember_graph(memory_key, G)
     return G
 
 
+def graph_memory_key(LOCAL_FILE_PATH: str, INTERVAL_PATH: str,
+                     options: tuple) -> Optional[str]:
+    '''
+    The in-memory graph cache key: the data files with their mtimes
+    and all graph options. None if a data file is missing.
+    '''
+    try:
+        return repr((
+            LOCAL_FILE_PATH, os.stat(LOCAL_FILE_PATH).st_mtime_ns,
+            INTERVAL_PATH, os.stat(INTERVAL_PATH).st_mtime_ns, options))
+    except (FileNotFoundError, TypeError):
+        return None
+
+
+def remember_graph(memory_key: Optional[str], G: nx.MultiDiGraph) -> None:
+    '''
+    Keep the graph in memory for later requests with the same options.
+    '''
+    if memory_key is None:
+        return
+
+    graph_cache[memory_key] = (G, original, intervals)
+    while len(graph_cache) > GRAPH_CACHE_SIZE:
+        # 淘汰最久未使用的图
+        del graph_cache[next(iter(graph_cache))]
+
+
+def min_hop_path(pred: dict, source: str, target: str) -> list[str]:
+    '''
+    Pick the shortest path with the fewest stations from a predecessor map.
+    '''
+    # 等价于在nx.all_shortest_paths的结果中取经过车站最少的第一条，
+    # 但不再枚举全部最短路径
+    succ = {}
+    for node, prev_nodes in pred.items():
+        for prev in prev_nodes:
+            succ.setdefault(prev, []).append(node)
+
+    # 从起点出发按前驱表的反向边计算每个车站的最少站数
+    hops = {source: 0}
+    queue = [source]
+    for node in queue:
+        for next_node in succ.get(node, ()):
+            if next_node not in hops:
+                hops[next_node] = hops[node] + 1
+                queue.append(next_node)
+
+    # 从终点回溯，每一步取前驱表中第一个仍能以最少站数到达起点的车站
+    path = [target]
+    node = target
+    while node != source:
+        node = next(prev for prev in pred[node]
+                    if hops.get(prev) == hops[node] - 1)
+        path.append(node)
+    path.reverse()
+    return path
+
+
 def find_shortest_route(G: nx.MultiDiGraph, start: str, end: str, data: list,
                         STATION_TABLE, MTR_VER, route_type: RouteType
                         ) -> list[str, int, int, int, list]:
@@ -1083,20 +1221,19 @@ def find_shortest_route(G: nx.MultiDiGraph, start: str, end: str, data: list,
     if start_station == end_station:
         return None, None, None, None, None
 
-    shortest_path = []
-    shortest_distance = -1
     try:
-        shortest_path = nx.all_shortest_paths(G, start_station,
-                                              end_station, weight='weight')
-        shortest_path = list(sorted(shortest_path, key=lambda x: len(x)))[0]
-        shortest_distance = nx.shortest_path_length(G, start_station,
-                                                    end_station,
-                                                    weight='weight')
-    except nx.exception.NetworkXNoPath:
-        return False, False, False, False, False
+        # 只运行一次Dijkstra，同时得到前驱表和最短距离
+        pred, dist = nx.dijkstra_predecessor_and_distance(G, start_station,
+                                                          weight='weight')
     except nx.exception.NodeNotFound:
         return False, False, False, False, False
 
+    if end_station not in dist:
+        return False, False, False, False, False
+
+    shortest_path = min_hop_path(pred, start_station, end_station)
+    shortest_distance = dist[end_station]
+
     return process_path(G, shortest_path, shortest_distance,
                         data, MTR_VER, route_type)
 
@@ -1109,9 +1246,9 @@ def remove_duplicate(data, ert):
         if i in removed_legs:
             continue
 
-        old_leg = list(sorted(ert[i], key=lambda x: x[4][0]))
+        old_leg = sorted(ert[i], key=lambda x: x[4][0])
         for j in range(i + 1, len(ert)):
-            new_leg = list(sorted(ert[j], key=lambda x: x[4][0]))
+            new_leg = sorted(ert[j], key=lambda x: x[4][0])
             if [x[2:4] + [x[4][3]] + x[6:9] for x in old_leg] == \
                     [x[2:4] + [x[4][3]] + x[6:9] for x in new_leg]:
                 for k in range(len(old_leg)):
@@ -1176,8 +1313,10 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
         station_1 = path[i]
         station_2 = path[i + 1]
         edge = G[station_1][station_2]
-        duration_list = []
-        waiting_list = []
+        # 线路名 -> 用时 / 等车时间，合并的边 (名称为列表) 单独记录
+        dur_map = {}
+        wait_map = {}
+        merged_wait = {}
         route_name_list = []
         platform_list = []
         for v in edge.values():
@@ -1185,12 +1324,14 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
             route_name = v['name']
             waiting = v['waiting']
             platform = v.get('platform')
-            duration_list.append((route_name, duration))
-            waiting_list.append((route_name, waiting))
             if isinstance(route_name, list):
                 route_name_list.extend(route_name)
+                for name in route_name:
+                    merged_wait[name] = waiting
             elif isinstance(route_name, str):
                 route_name_list.append(route_name)
+                dur_map.setdefault(route_name, duration)
+                wait_map.setdefault(route_name, waiting)
 
             if isinstance(platform, list):
                 platform_list.extend(platform)
@@ -1199,6 +1340,11 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
 
             waiting_time += waiting
 
+        for name, waiting in merged_wait.items():
+            if name not in dur_map:
+                dur_map[name] = original[(name, station_1, station_2)]
+                wait_map[name] = waiting
+
         if len(route_name_list) == 1:
             route_name = route_name_list[0]
         else:
@@ -1211,29 +1357,8 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
         sta2_name = stations[station_2]['name'].replace('|', ' ')
         sta1_id = station_1
         for i1, route_name in enumerate(route_name_list):
-            for x in duration_list:
-                if route_name == x[0]:
-                    duration = x[1]
-                    break
-            else:
-                for x in duration_list:
-                    for y in x[0]:
-                        if route_name == y:
-                            duration = original[(route_name,
-                                                 station_1, station_2)]
-                            break
-
-            for x in waiting_list:
-                if route_name == x[0]:
-                    waiting = x[1]
-                    break
-            else:
-                for x in waiting_list:
-                    for y in x[0]:
-                        if route_name == y:
-                            waiting = x[1]
-                            break
-
+            duration = dur_map[route_name]
+            waiting = wait_map[route_name]
             platform = platform_list[i1]
             for z in routes:
                 if z['name'] == route_name:
@@ -1295,7 +1420,7 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
 
                         terminus += [z['circular']]
 
-                    color = hex(z['color']).lstrip('0x').rjust(6, '0')
+                    color = f'#{z["color"]:06x}'
                     train_type = z['type']
                     if MTR_VER == 4:
                         route_id = z['id']
@@ -1303,7 +1428,7 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
                         route_id = None
                     break
             else:
-                color = '000000'
+                color = '#000000'
                 route = route_name
                 terminus = (route_name.split('，用时')[0], 'Walk')
                 if MTR_VER == 4 and route_type == RouteType.IN_THEORY:
@@ -1313,8 +1438,6 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
                 train_type = None
                 route_id = None
 
-            color = '#' + color
-
             sep_waiting = None
             if route_name in intervals:
                 sep_waiting = int(intervals[route_name])
@@ -1333,8 +1456,7 @@ def process_path(G: nx.MultiDiGraph, path: list, shortest_distance: int,
                 each_route_time.append(r)
 
         # each_route_time.sort(key=itemgetter(4))
-        each_route_time.sort(key=lambda x: natural_keys(x[3]))
-        each_route_time.sort(key=itemgetter(5))
+        each_route_time.sort(key=lambda x: (x[5], natural_keys(x[3])))
         every_route_time.append(each_route_time)
 
         each_route_time = []
@@ -1372,15 +1494,9 @@ def save_image(route_type: RouteType, every_route_time: list,
         else:
             terminus = route_data[4][0] + '方向 To ' + route_data[4][1]
 
-        time1 = str(strftime('%H:%M:%S', gmtime(route_data[5])))
-        time2 = str(strftime('%H:%M:%S', gmtime(route_data[6])))
-        time3 = str(strftime('%H:%M:%S', gmtime(route_data[7])))
-        if int(time1.split(':', maxsplit=1)[0]) == 0:
-            time1 = ''.join(time1.split(':', maxsplit=1)[1:])
-        if int(time2.split(':', maxsplit=1)[0]) == 0:
-            time2 = ''.join(time2.split(':', maxsplit=1)[1:])
-        if int(time3.split(':', maxsplit=1)[0]) == 0:
-            time3 = ''.join(time3.split(':', maxsplit=1)[1:])
+        time1 = format_time(route_data[5])
+        time2 = format_time(route_data[6])
+        time3 = format_time(route_data[7])
 
         if now_sta != last_sta:
             # 正常
@@ -1643,16 +1759,26 @@ def main(station1: str, station2: str, LINK: str,
     if LINK.endswith('/index.html'):
         LINK = LINK.rstrip('/index.html')
 
-    if UPDATE_DATA is True or (not os.path.exists(LOCAL_FILE_PATH)):
+    try:
+        data_mtime = os.stat(LOCAL_FILE_PATH).st_mtime
+    except FileNotFoundError:
+        data_mtime = None
+
+    if UPDATE_DATA is True or data_mtime is None:
         if LINK == '':
             raise ValueError('Railway System Map link is empty')
 
         data = fetch_data(LINK, LOCAL_FILE_PATH, MTR_VER)
+        data_mtime = os.path.getmtime(LOCAL_FILE_PATH)
     else:
-        with open(LOCAL_FILE_PATH, encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(LOCAL_FILE_PATH)
+
+    try:
+        interval_mtime = os.stat(INTERVAL_PATH).st_mtime
+    except FileNotFoundError:
+        interval_mtime = None
 
-    if GEN_ROUTE_INTERVAL is True or (not os.path.exists(INTERVAL_PATH)):
+    if GEN_ROUTE_INTERVAL is True or interval_mtime is None:
         # if MTR_VER == 4:
         #     raise NotImplementedError(
         #         'Please use the real-time pathfinder for MTR 4.0.0 '
@@ -1662,11 +1788,10 @@ def main(station1: str, station2: str, LINK: str,
             raise ValueError('Railway System Map link is empty')
 
         gen_route_interval(LOCAL_FILE_PATH, INTERVAL_PATH, LINK, MTR_VER)
+        interval_mtime = os.path.getmtime(INTERVAL_PATH)
 
-    version1 = strftime('%Y%m%d-%H%M',
-                        gmtime(os.path.getmtime(LOCAL_FILE_PATH)))
-    version2 = strftime('%Y%m%d-%H%M',
-                        gmtime(os.path.getmtime(INTERVAL_PATH)))
+    version1 = strftime('%Y%m%d-%H%M', gmtime(data_mtime))
+    version2 = strftime('%Y%m%d-%H%M', gmtime(interval_mtime))
 
     if IN_THEORY is True:
         route_type = RouteType.IN_THEORY
@@ -6,6 +6,7 @@ from array import array
 from datetime import datetime, timedelta, timezone
 from difflib import SequenceMatcher
 from enum import Enum
+from functools import lru_cache
 from io import BytesIO
 from math import gcd, sqrt
 from operator import itemgetter
@@ -24,12 +25,18 @@ from opencc import OpenCC
 from PIL import Image, ImageDraw, ImageFont
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 __version__ = '130'
 MAX_INT = 2 ** 64 - 1
 
 RUNNING_SPEED: int = 5.612          # 站内换乘速度，单位 block/s
 TRANSFER_SPEED: int = 4.317         # 出站换乘速度，单位 block/s
 WILD_WALKING_SPEED: int = 2.25      # 非出站换乘（越野）速度，单位 block/s
+DIGITS_RE = re.compile(r'(\d+)')    # 自然排序用的数字分段正则
 
 opencc1 = OpenCC('s2t')
 opencc2 = OpenCC('t2jp')
@@ -251,11 +258,28 @@ def atoi(text: str) -> Union[str, int]:
     return int(text) if text.isdigit() else text
 
 
-def natural_keys(text: str) -> list:
+@lru_cache(maxsize=4096)
+def natural_keys(text: str) -> tuple:
+    '''
+    A sorting key in number order (memoized, returned as a tuple).
+    '''
+    return tuple(atoi(c) for c in DIGITS_RE.split(text))
+
+
+def load_json(path: str):
     '''
-    A sorting key in number order.
+    Load a JSON data file, using orjson if it is installed.
+    With orjson the file is memory-mapped and parsed in place,
+    without reading a separate copy of its bytes.
     '''
-    return [atoi(c) for c in re.split(r'(\d+)', text)]
+    if orjson is None:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+            return orjson.loads(view)
 
 
 def lcm(a: int, b: int) -> int:
@@ -375,7 +399,7 @@ def fetch_data(link: str, LOCAL_FILE_PATH, MAX_WILD_BLOCKS) -> str:
     y = input(f'是否替换{LOCAL_FILE_PATH}文件? (Y/N) ').lower()
     if y == 'y':
         with open(LOCAL_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data_new, f)
+            json.dump(data_new, f, separators=(',', ':'))
 
     return data_new
 
@@ -404,7 +428,7 @@ def gen_departure(link: str, DEP_PATH) -> None:
     y = input(f'是否替换{DEP_PATH}文件? (Y/N) ').lower()
     if y == 'y':
         with open(DEP_PATH, 'w', encoding='utf-8') as f:
-            json.dump(dep_dict, f)
+            json.dump(dep_dict, f, separators=(',', ':'))
 
 
 def station_name_to_id(data: dict, sta: str, STATION_TABLE,
@@ -519,21 +543,20 @@ def gen_timetable(data: dict, IGNORED_LINES: list[str], ONLY_LINES: list[str],
     if not os.path.exists('mtr_pathfinder_temp'):
         os.makedirs('mtr_pathfinder_temp')
 
-    with open(DEP_PATH, 'r', encoding='utf-8') as f:
-        dep_data: dict[str, list[int]] = json.load(f)
+    dep_data: dict[str, list[int]] = load_json(DEP_PATH)
 
     filename = ''
-    m = hashlib.md5()
     if IGNORED_LINES == original_ignored_lines and \
             CALCULATE_BOAT is True and ONLY_LRT is False and \
             AVOID_STATIONS == [] and ONLY_LINES == [] and \
             route_type == RouteType.REAL_TIME:
-        for s in original_ignored_lines:
-            m.update(s.encode('utf-8'))
+        # 逐项update与对拼接结果做一次摘要等价，文件名保持不变
+        ignored_hash = hashlib.md5(
+            ''.join(original_ignored_lines).encode('utf-8')).hexdigest()
 
         filename = f'mtr_pathfinder_temp{os.sep}' + \
             f'4{int(CALCULATE_HIGH_SPEED)}{int(CALCULATE_WALKING_WILD)}' + \
-            f'-{version1}-{version2}-{m.hexdigest()}-{__version__}.dat'
+            f'-{version1}-{version2}-{ignored_hash}-{__version__}.dat'
         if os.path.exists(filename):
             with open(filename, 'r+b') as f:
                 mmapped_file = mmap.mmap(f.fileno(), 0)
@@ -664,8 +687,7 @@ def gen_timetable(data: dict, IGNORED_LINES: list[str], ONLY_LINES: list[str],
 def load_tt(tt_dict: dict[tuple], data, start, end, departure_time: int,
             DEP_PATH, STATION_TABLE, TRANSFER_ADDITION,
             CALCULATE_WALKING_WILD, WILD_ADDITION, MAX_HOUR):
-    with open(DEP_PATH, 'r', encoding='utf-8') as f:
-        dep_data: dict[str, list[int]] = json.load(f)
+    dep_data: dict[str, list[int]] = load_json(DEP_PATH)
 
     timetable: list[tuple] = []
     start_station = station_name_to_id(data, start, STATION_TABLE)
@@ -841,16 +863,15 @@ def process_path(result: list[tuple], start: str, end: str,
             terminus = (t1_name, t2_name)
             platform = x[4][2]
 
-            color = hex(z['color']).lstrip('0x').rjust(6, '0')
+            color = f'#{z["color"]:06x}'
             train_type = z['type']
         else:
-            color = '000000'
+            color = '#000000'
             route = route_name
             terminus = (route_name.split('，用时')[0], 'Walk')
             train_type = None
             platform = None
 
-        color = '#' + color
         r = (sta1_name, sta2_name, color, route, terminus,
              x[2], x[3], train_type, platform, route_name)
         every_route_time.append(r)
@@ -1111,8 +1132,7 @@ def main(station1: str, station2: str, LINK: str,
 
         data = fetch_data(LINK, LOCAL_FILE_PATH, MAX_WILD_BLOCKS)
     else:
-        with open(LOCAL_FILE_PATH, encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(LOCAL_FILE_PATH)
 
     if GEN_DEPARTURE is True or (not os.path.exists(DEP_PATH)):
         if LINK == '':
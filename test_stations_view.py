@@ -0,0 +1,42 @@
+import importlib
+import json
+import sys
+
+import pytest
+
+
+# MTR 3 数据：线路的站点列表为"车站ID_站台ID"形式的字符串，而不是字典
+MTR3_DATA = [{
+    'stations': {
+        'st1': {'id': 'st1', 'name': 'Spawn|出生点', 'color': 0},
+        'st2': {'id': 'st2', 'name': 'Sundogs|幻日', 'color': 0},
+    },
+    'routes': [
+        {'id': 'r1', 'name': 'Red Line|紅線||1', 'number': '1', 'color': 0,
+         'type': 'train_normal', 'stations': ['st1_p1', 'st2_p2'],
+         'durations': [60000]},
+    ],
+}]
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    # main导入时会写出config.json，在临时目录中导入，不修改仓库中的文件
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop('main', None)
+    module = importlib.import_module('main')
+    yield module
+    sys.modules.pop('main', None)
+
+
+def test_stations_page_with_mtr3_string_stops(main, tmp_path, monkeypatch):
+    data_file_path = tmp_path / 'mtr-station-data-v3.json'
+    data_file_path.write_text(json.dumps(MTR3_DATA), encoding='utf-8')
+    monkeypatch.setitem(main.config, 'LOCAL_FILE_PATH_V3', str(data_file_path))
+
+    # 数据更新后的预热同样需要处理字符串形式的站点
+    main.warm_list_views()
+
+    response = main.app.test_client().get('/stations')
+    assert response.status_code == 200
+    assert 'Spawn' in response.get_data(as_text=True)